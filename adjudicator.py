@@ -18,10 +18,18 @@
   ############################################################################
 
 
+import os
 import re
+import time
 import subprocess
 
-from board import terr_names
+import resolver
+
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+from board import offshore, terr_names
+from cache import TieredCache, digest
+from graph import Graph
 
 
 def format_board(board):
@@ -73,17 +81,27 @@ def parse_ret(s):
     return t1, t2s
 
 
-def adjudicate(board, orders):
-    payload = format_board(board) + "\n" + format_orders(orders) + "\n"
+cdippy_timeout = 30
+
+
+def run_cdippy(payload):
+    try:
+        cp = subprocess.run(
+            ["cdippy"], input=payload, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, universal_newlines=True,
+            timeout=cdippy_timeout)
 
-    cp = subprocess.run(
-        ["cdippy"], input=payload, stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE, universal_newlines=True)
+    except subprocess.TimeoutExpired:
+        raise ValueError(payload)
 
     if cp.stderr:
         raise ValueError(payload)
 
-    lines = iter(cp.stdout.splitlines())
+    return cp.stdout
+
+
+def parse_output(orders, payload, output):
+    lines = iter(output.splitlines())
 
     resolutions = [None if o.kind == "HOLD" else parse_res(next(lines)) for o in orders]
 
@@ -99,3 +117,298 @@ def adjudicate(board, orders):
     return resolutions, retreats
 
 
+def make_payload(board, orders):
+    return format_board(board) + "\n" + format_orders(orders) + "\n"
+
+
+def cdippy_adjudicate(board, orders):
+    payload = make_payload(board, orders)
+
+    return parse_output(orders, payload, run_cdippy(payload))
+
+
+def cdippy_adjudicate_batch(jobs):
+    ret = []
+
+    for board, orders in jobs:
+        try:
+            ret.append(cdippy_adjudicate(board, orders))
+        except ValueError as e:
+            ret.append(e)
+
+    return ret
+
+
+backends = {
+    "cdippy": cdippy_adjudicate,
+    "native": resolver.adjudicate
+}
+
+# Backends that can take several jobs in one go, returning either the
+# result or the exception of each of them
+batch_backends = {
+    "cdippy": cdippy_adjudicate_batch
+}
+
+default_backend = "cdippy"
+
+
+cache_size = 4096
+cache_dir = None
+
+cache = None
+time_spent = 0.0
+
+
+def get_cache():
+    global cache
+
+    if cache is None:
+        cache = TieredCache(cache_size, cache_dir)
+
+    return cache
+
+
+def order_key(o):
+    return o.key(), o.coast or "", bool(o.via_c)
+
+
+def position_key(board, ts=None):
+    return tuple(sorted(
+        (t, terr.coast or "", terr.kind, terr.occupied)
+        for t, terr in board.items()
+        if terr.occupied and (ts is None or t in ts)))
+
+
+def add_time_spent(elapsed):
+    global time_spent
+
+    # Adjudications run on several threads
+    with get_cache().lock:
+        time_spent += elapsed
+
+
+def cache_stats():
+    c = get_cache()
+    ret = c.stats()
+    misses = ret["misses"]
+
+    with c.lock:
+        spent = time_spent
+
+    ret["time_spent"] = spent
+    ret["time_saved"] = (
+        spent / misses * (ret["hits"] + ret["disk_hits"]) if misses else 0.0)
+
+    return ret
+
+
+def order_terrs(o):
+    return {t for t in (o.terr, o.orig, o.targ) if t}
+
+
+def order_components(orders):
+    # Two orders interact only if they involve a common territory: this
+    # covers shared targets, head to heads, supports (and their cutting)
+    # and convoy chains, whose fleets all name the convoyed army's move
+    g = Graph()
+    first = {}
+
+    for i, o in enumerate(orders):
+        g.add_vertex(i)
+
+        for t in order_terrs(o):
+            j = first.setdefault(t, i)
+
+            if j != i:
+                g.add_edge((i, j))
+
+    return [sorted(c) for c in g.components()]
+
+
+def cache_entry(board, orders, backend, ts=None):
+    # Results are stored for the orders sorted by key, so that the same
+    # turn hits the cache whatever order the orders come in
+    keys = [order_key(o) for o in orders]
+    perm = sorted(range(len(orders)), key=keys.__getitem__)
+
+    key = digest((backend, position_key(board, ts), [keys[i] for i in perm]))
+
+    return key, perm
+
+
+def unsort(value, perm):
+    sorted_resolutions, retreats = value
+
+    resolutions = [None] * len(perm)
+
+    for r, i in zip(sorted_resolutions, perm):
+        resolutions[i] = r
+
+    return resolutions, {t: set(ts) for t, ts in retreats.items()}
+
+
+def adjudicate_cached(board, orders, backend, ts=None):
+    key, perm = cache_entry(board, orders, backend, ts)
+
+    c = get_cache()
+    value = c.get(key)
+
+    if value is None:
+        start = time.perf_counter()
+        value = backends[backend](board, [orders[i] for i in perm])
+        add_time_spent(time.perf_counter() - start)
+
+        c.put(key, value)
+
+    return unsort(value, perm)
+
+
+# Backends that run in this process. Splitting the orders of the others
+# would only multiply the processes spawned, and their retreats would
+# have to come from another engine
+split_backends = {"native"}
+
+
+def fleets_at_sea(board):
+    return {t for t, terr in board.items()
+            if terr.occupied and terr.kind == "F" and t in offshore}
+
+
+# Splitting is off by default: every group still costs a resolver over
+# the whole board, so it only pays off when most groups hit the cache
+def adjudicate(board, orders, backend=None, use_cache=True, split=False):
+    backend = backend or default_backend
+
+    if split and backend in split_backends:
+        components = order_components(orders)
+    else:
+        components = []
+
+    if len(components) < 2:
+        if not use_cache:
+            return backends[backend](board, orders)
+
+        return adjudicate_cached(board, orders, backend)
+
+    fleets = fleets_at_sea(board)
+
+    def run(component):
+        group = [orders[i] for i in component]
+
+        if not use_cache:
+            return backends[backend](board, group)
+
+        # Any fleet at sea can decide whether an army moves by convoy,
+        # or can't move at all
+        ts = fleets.union(*map(order_terrs, group))
+
+        return adjudicate_cached(board, group, backend, ts)
+
+    results = map(run, components)
+
+    resolutions = [None] * len(orders)
+
+    for component, (rs, _) in zip(components, results):
+        for i, r in zip(component, rs):
+            resolutions[i] = r
+
+    # Where a dislodged unit may retreat to depends on the whole board.
+    # Only the native engine is split, so these are still its own rulings
+    retreats = resolver.retreats(board, orders, resolutions)
+
+    for i, o in enumerate(orders):
+        if o.kind == "HOLD":
+            resolutions[i] = o.terr not in retreats
+
+    return resolutions, retreats
+
+
+batch_size = 8
+batch_workers = os.cpu_count() or 1
+
+batch_executor = None
+
+
+def get_batch_executor():
+    global batch_executor
+
+    if batch_executor is None:
+        # One cdippy process running for every CPU
+        batch_executor = ThreadPoolExecutor(batch_workers)
+
+    return batch_executor
+
+
+def done_future(fn, *args):
+    ret = Future()
+
+    try:
+        ret.set_result(fn(*args))
+    except Exception as e:
+        ret.set_exception(e)
+
+    return ret
+
+
+def adjudicate_many(jobs, backend=None, use_cache=True):
+    # Generates (index, future) pairs, as the (board, orders) jobs are
+    # adjudicated, in order of completion
+    backend = backend or default_backend
+
+    if backend not in batch_backends:
+        for i, (board, orders) in enumerate(jobs):
+            yield i, done_future(adjudicate, board, orders, backend, use_cache)
+
+        return
+
+    c = get_cache()
+    pending = []
+
+    for i, (board, orders) in enumerate(jobs):
+        key, perm = cache_entry(board, orders, backend)
+        value = c.get(key) if use_cache else None
+
+        if value is not None:
+            yield i, done_future(unsort, value, perm)
+        else:
+            pending.append((i, key, perm, board, [orders[j] for j in perm]))
+
+    def run(batch):
+        start = time.perf_counter()
+        ret = batch_backends[backend]([(b, os) for i, k, p, b, os in batch])
+
+        return ret, time.perf_counter() - start
+
+    futures = {}
+
+    for n in range(0, len(pending), batch_size):
+        batch = pending[n:n+batch_size]
+        futures[get_batch_executor().submit(run, batch)] = batch
+
+    for f in as_completed(futures):
+        batch = futures[f]
+
+        try:
+            results, elapsed = f.result()
+
+        except Exception as e:
+            results = [e] * len(batch)
+
+        else:
+            if use_cache:
+                add_time_spent(elapsed)
+
+        for (i, key, perm, board, orders), value in zip(batch, results):
+            ret = Future()
+
+            if isinstance(value, Exception):
+                ret.set_exception(value)
+
+            else:
+                if use_cache:
+                    c.put(key, value)
+
+                ret.set_result(unsort(value, perm))
+
+            yield i, ret
@@ -0,0 +1,242 @@
+  ############################################################################
+  # Diplobot - play Diplomacy through Telegram                               #
+  # Copyright (C) 2018 Simone Cimarelli a.k.a. AquilaIrreale                 #
+  #                                                                          #
+  # This program is free software: you can redistribute it and/or modify     #
+  # it under the terms of the GNU Affero General Public License as published #
+  # by the Free Software Foundation, either version 3 of the License, or     #
+  # (at your option) any later version.                                      #
+  #                                                                          #
+  # This program is distributed in the hope that it will be useful,          #
+  # but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+  # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+  # GNU Affero General Public License for more details.                      #
+  #                                                                          #
+  # You should have received a copy of the GNU Affero General Public License #
+  # along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+  ############################################################################
+
+
+
+from collections.abc import Set
+
+
+def bits(mask):
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+# Tables are shared by everything built from the same names, even when
+# they come from a pickle, so that their sets can be combined directly
+
+interned = {}
+
+
+def ids_for(names):
+    names = tuple(names)
+
+    try:
+        return interned[names]
+
+    except KeyError:
+        ret = interned[names] = Ids(names)
+        return ret
+
+
+class Ids:
+    """Interned integer ids for a fixed collection of names"""
+
+    def __init__(self, names):
+        self.names = tuple(names)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+
+    def __reduce__(self):
+        return ids_for, (self.names,)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, name):
+        return self.ids[name]
+
+    def mask(self, items):
+        if isinstance(items, BitSet) and items.universe is self:
+            return items.mask
+
+        mask = 0
+
+        for item in items:
+            mask |= 1 << (item if isinstance(item, int) else self.ids[item])
+
+        return mask
+
+    def set(self, items=()):
+        return BitSet(self, self.mask(items))
+
+
+class BitSet(Set):
+    """Immutable set of names from an Ids table, stored as an integer
+    with one bit per id. Iterating it yields the names, like the sets
+    of strings it replaces; operations between sets of the same table
+    are single integer operations"""
+
+    __slots__ = ("universe", "mask")
+
+    def __init__(self, universe, mask=0):
+        self.universe = universe
+        self.mask = mask
+
+    def __reduce__(self):
+        return BitSet, (self.universe, self.mask)
+
+    def _mask_of(self, other):
+        if isinstance(other, BitSet) and other.universe is self.universe:
+            return other.mask
+
+        # Names from outside the table can't be in any of its sets
+        mask = 0
+
+        for item in other:
+            i = item if isinstance(item, int) else self.universe.ids.get(item)
+
+            if i is not None:
+                mask |= 1 << i
+
+        return mask
+
+    def _from(self, mask):
+        return BitSet(self.universe, mask)
+
+    def __contains__(self, item):
+        try:
+            i = self.universe.ids[item]
+
+        except KeyError:
+            if not isinstance(item, int):
+                return False
+
+            i = item
+
+        except TypeError:
+            return False
+
+        return self.mask >> i & 1 == 1
+
+    def __iter__(self):
+        names = self.universe.names
+        return (names[i] for i in bits(self.mask))
+
+    def ids(self):
+        return bits(self.mask)
+
+    def __len__(self):
+        return bin(self.mask).count("1")
+
+    def __bool__(self):
+        return bool(self.mask)
+
+    def __hash__(self):
+        return self._hash()
+
+    def __eq__(self, other):
+        if isinstance(other, BitSet) and other.universe is self.universe:
+            return self.mask == other.mask
+
+        return Set.__eq__(self, other)
+
+    def __or__(self, other):
+        if not isinstance(other, Set):
+            return NotImplemented
+
+        if not isinstance(other, BitSet) or other.universe is not self.universe:
+            # The result may hold names from outside the table
+            if any(t not in self.universe.ids for t in other):
+                return set(self) | set(other)
+
+        return self._from(self.mask | self._mask_of(other))
+
+    __ror__ = __or__
+
+    def __and__(self, other):
+        if not isinstance(other, Set):
+            return NotImplemented
+
+        return self._from(self.mask & self._mask_of(other))
+
+    __rand__ = __and__
+
+    def __sub__(self, other):
+        if not isinstance(other, Set):
+            return NotImplemented
+
+        return self._from(self.mask & ~self._mask_of(other))
+
+    def __rsub__(self, other):
+        if not isinstance(other, Set):
+            return NotImplemented
+
+        return {t for t in other if t not in self}
+
+    def __xor__(self, other):
+        if not isinstance(other, Set):
+            return NotImplemented
+
+        return (self - other) | (other - self)
+
+    __rxor__ = __xor__
+
+    def __le__(self, other):
+        if isinstance(other, BitSet) and other.universe is self.universe:
+            return self.mask & ~other.mask == 0
+
+        return Set.__le__(self, other)
+
+    def __ge__(self, other):
+        if isinstance(other, BitSet) and other.universe is self.universe:
+            return other.mask & ~self.mask == 0
+
+        return Set.__ge__(self, other)
+
+    def isdisjoint(self, other):
+        return not self.mask & self._mask_of(other)
+
+    def union(self, *others):
+        ret = self
+
+        for other in others:
+            ret = ret | (other if isinstance(other, Set) else set(other))
+
+        return ret
+
+    def intersection(self, *others):
+        mask = self.mask
+
+        for other in others:
+            mask &= self._mask_of(other)
+
+        return self._from(mask)
+
+    def difference(self, *others):
+        mask = self.mask
+
+        for other in others:
+            mask &= ~self._mask_of(other)
+
+        return self._from(mask)
+
+    def issubset(self, other):
+        return self <= (other if isinstance(other, Set) else set(other))
+
+    def issuperset(self, other):
+        return self >= (other if isinstance(other, Set) else set(other))
+
+    def copy(self):
+        return self
+
+    def __copy__(self):
+        return self
+
+    def __repr__(self):
+        return "BitSet({{{}}})".format(", ".join(map(repr, self)))
@@ -18,9 +18,12 @@
   ############################################################################
 
 
-from copy import copy
 from itertools import chain
+from collections import Counter
 
+import bundle
+
+from bitset import BitSet, bits, ids_for
 from graph import Graph
 from insensitive_list import InsensitiveList
 
@@ -44,10 +47,6 @@ def load_graph(filename):
     return Graph(graph_dict)
 
 
-sea_graph = load_graph("assets/sea_graph")
-land_graph = load_graph("assets/land_graph")
-
-
 def strip_coast(t):
     return t[:3]
 
@@ -56,81 +55,162 @@ def get_coast(t):
     return t[3:]
 
 
-full_graph = Graph()
+@bundle.part("map", "assets/sea_graph", "assets/land_graph",
+             modules=("graph", "insensitive_list"))
+def build_map():
+    sea_graph = load_graph("assets/sea_graph")
+    land_graph = load_graph("assets/land_graph")
 
-for t1, t2 in chain(sea_graph.edges(), land_graph.edges()):
-    full_graph.add_edge((strip_coast(t1), strip_coast(t2)))
+    full_graph = Graph()
 
-territories = {
-    strip_coast(t) for t in chain(land_graph.vertices(), sea_graph.vertices())
-}
+    for t1, t2 in chain(sea_graph.edges(), land_graph.edges()):
+        full_graph.add_edge((strip_coast(t1), strip_coast(t2)))
 
-terr_names = InsensitiveList(sorted({strip_coast(t) for t in territories}, key=str.upper))
+    territories = {
+        strip_coast(t) for t in chain(land_graph.vertices(), sea_graph.vertices())
+    }
 
-offshore = {t for t in sea_graph.vertices() if strip_coast(t) not in land_graph.vertices()}
-coast = {strip_coast(t) for t in sea_graph.vertices() - offshore}
+    terr_names = InsensitiveList(sorted({strip_coast(t) for t in territories}, key=str.upper))
 
-offshore_graph = Graph({
-    t1: {t2 for t2 in t2s if t2 in offshore}
-    for t1, t2s in sea_graph.dict.items()
-    if t1 in offshore
-})
+    offshore = {t for t in sea_graph.vertices() if strip_coast(t) not in land_graph.vertices()}
+    coast = {strip_coast(t) for t in sea_graph.vertices() - offshore}
 
-seas = tuple(offshore_graph.components())
-coasts = tuple(sea_graph.neighbors(sea) for sea in seas)
+    offshore_graph = Graph({
+        t1: {t2 for t2 in t2s if t2 in offshore}
+        for t1, t2s in sea_graph.dict.items()
+        if t1 in offshore
+    })
 
-split_coasts = {t for t in coast if tuple(map(strip_coast, sea_graph.vertices())).count(t) > 1}
+    seas = tuple(offshore_graph.components())
+    coasts = tuple(sea_graph.neighbors(sea) for sea in seas)
 
-supp_centers = set()
-home_centers = {}
+    # Territories with more than one coast appear once per coast among
+    # the vertices of the sea graph
+    coast_count = Counter(map(strip_coast, sea_graph.vertices()))
+    split_coasts = {t for t in coast if coast_count[t] > 1}
 
-with open("assets/supply_centers") as f:
-    nation = None
+    return (sea_graph, land_graph, full_graph, territories, terr_names,
+            offshore, coast, offshore_graph, seas, coasts, split_coasts)
 
-    for line in f:
-        if not line.strip():
-            continue
 
-        try:
-            nation, rhs = tuple(map(str.strip, line.split(":")))
+(sea_graph, land_graph, full_graph, territories, terr_names,
+ offshore, coast, offshore_graph, seas, coasts, split_coasts) = bundle.get("map")
 
-        except ValueError as e:
-            if nation is None:
-                raise e
 
-            rhs = line
+# Every territory, and every coast of the split ones, gets an integer id;
+# territory sets are bitsets over those ids
 
-        centers = set(filter(None, (t.strip() for t in rhs.split(" "))))
-        supp_centers |= centers
+terr_ids = ids_for(sorted(territories | sea_graph.vertices()))
+
+territories = terr_ids.set(territories)
+offshore = terr_ids.set(offshore)
+coast = terr_ids.set(coast)
+split_coasts = terr_ids.set(split_coasts)
+
+
+def adjacency(graph, stripped=False):
+    ret = [0] * len(terr_ids)
+
+    for t1, t2s in graph.dict.items():
+        if stripped:
+            t2s = map(strip_coast, t2s)
+
+        ret[terr_ids[t1]] = terr_ids.mask(t2s) & ~(1 << terr_ids[t1])
+
+    return ret
+
+
+land_adjacency = adjacency(land_graph)
+sea_adjacency = adjacency(sea_graph)
+full_adjacency = adjacency(full_graph)
+
+# Sea neighbors with the coasts stripped, i.e. fleet destinations
+sea_dests = adjacency(sea_graph, stripped=True)
+
+terr_bits = tuple((t, 1 << terr_ids[t]) for t in territories)
+
+
+@bundle.part("distances", "assets/sea_graph", "assets/land_graph",
+             modules=("graph",))
+def build_distances():
+    return (full_graph.distance_table(),
+            land_graph.distance_table(),
+            sea_graph.distance_table())
+
+
+full_distances, land_distances, sea_distances = bundle.get("distances")
+
+
+@bundle.part("centers", "assets/supply_centers")
+def load_centers():
+    supp_centers = set()
+    home_centers = {}
+
+    with open("assets/supply_centers") as f:
+        nation = None
+
+        for line in f:
+            if not line.strip():
+                continue
 
-        if nation:
             try:
-                home_centers[nation].update(centers)
+                nation, rhs = tuple(map(str.strip, line.split(":")))
+
+            except ValueError as e:
+                if nation is None:
+                    raise e
+
+                rhs = line
+
+            centers = set(filter(None, (t.strip() for t in rhs.split(" "))))
+            supp_centers |= centers
+
+            if nation:
+                try:
+                    home_centers[nation].update(centers)
+
+                except KeyError:
+                    home_centers[nation] = centers
 
-            except KeyError:
-                home_centers[nation] = centers
+    return supp_centers, home_centers
+
+
+supp_centers, home_centers = bundle.get("centers")
+
+supp_centers = terr_ids.set(supp_centers)
+home_centers = {n: terr_ids.set(cs) for n, cs in home_centers.items()}
+
+center_bits = tuple((t, 1 << terr_ids[t]) for t in supp_centers)
 
 nations = sorted(n for n in home_centers)
 
-default_kind = {}
-default_coast = {}
 
-with open("assets/default_units") as f:
-    for line in f:
-        if not line.strip():
-            continue
+@bundle.part("units", "assets/default_units")
+def load_units():
+    default_kind = {}
+    default_coast = {}
 
-        words = tuple(filter(None, (s.strip() for s in line.split(" "))))
+    with open("assets/default_units") as f:
+        for line in f:
+            if not line.strip():
+                continue
 
-        try:
-            t, kind, coast = words
+            words = tuple(filter(None, (s.strip() for s in line.split(" "))))
+
+            try:
+                t, kind, c = words
+
+            except ValueError:
+                t, kind = words
+                c = None
+
+            default_kind[t] = kind
+            default_coast[t] = c
+
+    return default_kind, default_coast
 
-        except ValueError:
-            t, kind = words
-            coast = None
 
-        default_kind[t] = kind
-        default_coast[t] = coast
+default_kind, default_coast = bundle.get("units")
 
 
 def infer_kind(t):
@@ -150,116 +230,148 @@ class Territory:
             self.owner, self.occupied, self.kind, self.coast)
 
 
-class Board(dict):
-    def __init__(self):
-        super().__init__(self)
+class Position:
+    """Queries on a board position, shared by the board representations:
+    self[t] gives the territory t, with its owner, occupier, kind and
+    coast"""
 
-        for t in territories:
-            for n in nations:
-                if t in home_centers[n]:
-                    self[t] = Territory(owner=n,
-                                        occupied=n,
-                                        kind=default_kind[t],
-                                        coast=default_coast[t])
-                    break
+    __slots__ = ()
 
-            else:
-                self[t] = Territory()
+    def place_unit(self, t, nation, kind, coast=None):
+        terr = self[t]
+        terr.occupied = nation
+        terr.kind = kind
+        terr.coast = coast
+
+    def remove_unit(self, t):
+        self.place_unit(t, None, None)
+
+    def set_owner(self, t, nation):
+        self[t].owner = nation
+
+    def empty(self):
+        for t in territories:
+            self.remove_unit(t)
+            self.set_owner(t, None)
 
     def occupied(self, nations=nations):
         if isinstance(nations, str):
             nations = {nations}
 
-        return {t for t in territories if self[t].occupied in nations}
+        mask = 0
+
+        for t, bit in terr_bits:
+            if self[t].occupied in nations:
+                mask |= bit
+
+        return BitSet(terr_ids, mask)
 
     def owned(self, nations=nations):
         if isinstance(nations, str):
             nations = {nations}
 
-        return {t for t in supp_centers if self[t].owner in nations}
+        mask = 0
+
+        for t, bit in center_bits:
+            if self[t].owner in nations:
+                mask |= bit
+
+        return BitSet(terr_ids, mask)
 
     def valid_dests(self, t):
         if not self[t].occupied:
-            return set()
+            return BitSet(terr_ids)
 
         if self[t].kind == "A":
-            return land_graph.neighbors(t)
+            return BitSet(terr_ids, land_adjacency[terr_ids[t]])
 
         if t in split_coasts:
             assert self[t].coast in {"(NC)", "(SC)"}
             t += self[t].coast
 
-        return {strip_coast(x) for x in sea_graph.neighbors(t)}
+        return BitSet(terr_ids, sea_dests[terr_ids[t]])
 
     def valid_dests_via_c(self, t, excluded={}):
         if (t not in coast
                 or not self[t].occupied
                 or self[t].kind != "A"):
 
-            return set()
+            return BitSet(terr_ids)
 
-        to_check = full_graph.neighbors(t) & offshore
-        checked = set()
-        ret = set()
+        names = terr_ids.names
+        excluded = terr_ids.mask(excluded)
 
-        while to_check:
-            t1 = to_check.pop()
-            checked.add(t1)
+        to_check = full_adjacency[terr_ids[t]] & offshore.mask
+        checked = 0
+        ret = 0
 
-            if not self[t1].occupied or t1 in excluded:
-                continue
+        while to_check:
+            bit = to_check & -to_check
+            to_check ^= bit
+            checked |= bit
 
-            for t2 in sea_graph.neighbors(t1):
-                t2 = strip_coast(t2)
+            i = bit.bit_length() - 1
 
-                if t2 in coast:
-                    ret.add(t2)
+            if not self[names[i]].occupied or bit & excluded:
+                continue
 
-                elif t2 not in checked:
-                    to_check.add(t2)
+            ret |= sea_dests[i] & coast.mask
+            to_check |= sea_dests[i] & ~coast.mask & ~checked
 
-        ret.discard(t)
+        ret &= ~(1 << terr_ids[t])
 
-        return ret
+        return BitSet(terr_ids, ret)
 
     def contiguous_fleets(self, ts):
         assert all(t in offshore for t in ts)
 
         nations = {self[t].occupied for t in ts if self[t].occupied}
 
-        to_check = sea_graph.neighbors(ts)
-        checked = set()
-        ret = set(ts)
+        names = terr_ids.names
+        ret = terr_ids.mask(ts)
+
+        to_check = 0
+
+        for i in bits(ret):
+            to_check |= sea_adjacency[i]
+
+        to_check &= ~ret
+        checked = 0
 
         while to_check:
-            t = to_check.pop()
+            bit = to_check & -to_check
+            to_check ^= bit
+            checked |= bit
 
-            checked.add(t)
+            i = bit.bit_length() - 1
+            t = names[i]
 
-            if (t in offshore
+            if (bit & offshore.mask
                     and self[t].occupied
                     and self[t].occupied not in nations):
 
-                ret.add(t)
+                ret |= bit
 
-                to_check |= sea_graph.neighbors(t) - checked
+                to_check |= sea_adjacency[i] & ~checked
 
-        return ret
+        return BitSet(terr_ids, ret)
 
     def needs_via_c(self, t1, t2):
         assert self[t1].occupied
 
-        ts = {t1, t2}
-
-        if (not ts.issubset(coast)
+        if (t1 not in coast
+                or t2 not in coast
                 or self[t1].kind != "F"
                 or t2 not in self.valid_dests(t1)):
 
             return False
 
-        for t3 in full_graph.shared_neighbors(ts):
-            if (t3 in offshore
-                    and self[t3].occupied
+        shared = (full_adjacency[terr_ids[t1]]
+                  & full_adjacency[terr_ids[t2]]
+                  & offshore.mask)
+
+        for t3 in BitSet(terr_ids, shared):
+            if (self[t3].occupied
                     and self[t3].occupied != self[t1].occupied):
 
                 return True
@@ -283,3 +395,260 @@ class Board(dict):
             return None
 
         return next(get_coast(t) for t in neighs if strip_coast(t) == t2)
+
+
+class Board(Position, dict):
+    """Board of Territory objects, indexed by name. It keeps the units
+    and the centers of each nation as bitset masks, so units must be
+    placed and removed, and centers taken, through place_unit,
+    remove_unit and set_owner rather than by writing to the territories
+    directly. Its snapshots are compact boards, see compact()"""
+
+    def __init__(self):
+        super().__init__(self)
+
+        self._units = {n: 0 for n in nations}
+        self._centers = {n: 0 for n in nations}
+
+        for t in territories:
+            for n in nations:
+                if t in home_centers[n]:
+                    self[t] = Territory(owner=n,
+                                        occupied=n,
+                                        kind=default_kind[t],
+                                        coast=default_coast[t])
+
+                    self._units[n] |= 1 << terr_ids[t]
+                    self._centers[n] |= 1 << terr_ids[t]
+                    break
+
+            else:
+                self[t] = Territory()
+
+    def compact(self):
+        return CompactBoard(self)
+
+    def place_unit(self, t, nation, kind, coast=None):
+        bit = 1 << terr_ids[t]
+        old = self[t].occupied
+
+        if old:
+            self._units[old] &= ~bit
+
+        if nation:
+            self._units[nation] = self._units.get(nation, 0) | bit
+
+        super().place_unit(t, nation, kind, coast)
+
+    def set_owner(self, t, nation):
+        bit = 1 << terr_ids[t]
+        old = self[t].owner
+
+        if old:
+            self._centers[old] &= ~bit
+
+        if nation:
+            self._centers[nation] = self._centers.get(nation, 0) | bit
+
+        super().set_owner(t, nation)
+
+    def occupied(self, nations=nations):
+        if isinstance(nations, str):
+            nations = (nations,)
+
+        mask = 0
+
+        for n in nations:
+            mask |= self._units.get(n, 0)
+
+        return BitSet(terr_ids, mask)
+
+    def owned(self, nations=nations):
+        if isinstance(nations, str):
+            nations = (nations,)
+
+        mask = 0
+
+        for n in nations:
+            mask |= self._centers.get(n, 0)
+
+        return BitSet(terr_ids, mask & supp_centers.mask)
+
+
+# A compact board stores each field of every territory as a small code,
+# the index of its value in field_values
+
+field_names = ("owner", "occupied", "kind", "coast")
+
+field_values = (
+    (None,) + tuple(nations),
+    (None,) + tuple(nations),
+    (None, "A", "F"),
+    (None, "(NC)", "(SC)"),
+)
+
+field_codes = tuple({v: i for i, v in enumerate(vs)} for vs in field_values)
+
+stride = len(terr_ids)
+
+
+def compact_field(f):
+    def get(self):
+        return field_values[f][self.board._data[f * stride + self.i]]
+
+    def set(self, value):
+        try:
+            code = field_codes[f][value]
+
+        except KeyError:
+            raise ValueError("Invalid {}: {!r}".format(field_names[f], value))
+
+        self.board._write(f * stride + self.i, code)
+
+    return property(get, set)
+
+
+class TerritoryView:
+    """Territory of a CompactBoard, read and written in place"""
+
+    __slots__ = ("board", "i")
+
+    def __init__(self, board, i):
+        self.board = board
+        self.i = i
+
+    owner = compact_field(0)
+    occupied = compact_field(1)
+    kind = compact_field(2)
+    coast = compact_field(3)
+
+    def __repr__(self):
+        return "Territory(owner={}, occupied={}, kind={}, coast={})".format(
+            self.owner, self.occupied, self.kind, self.coast)
+
+
+class CompactBoard(Position):
+    """Board stored as parallel byte arrays of owners, occupiers, unit
+    kinds and coasts, indexed by territory id: a whole position takes a
+    few hundred bytes. Snapshots share the arrays with the board until
+    either of them writes to them"""
+
+    __slots__ = ("_data", "_shared")
+
+    def __init__(self, board=None):
+        if board is None:
+            board = Board()
+
+        data = bytearray(len(field_names) * stride)
+
+        for t, terr in board.items():
+            i = terr_ids[t]
+
+            for f, name in enumerate(field_names):
+                data[f * stride + i] = field_codes[f][getattr(terr, name)]
+
+        self._data = data
+        self._shared = False
+
+    @classmethod
+    def frombytes(cls, data):
+        ret = cls.__new__(cls)
+        ret._data = bytes(data)
+        ret._shared = True
+
+        return ret
+
+    def __bytes__(self):
+        return bytes(self._data)
+
+    def __reduce__(self):
+        return CompactBoard.frombytes, (bytes(self._data),)
+
+    def _write(self, i, code):
+        if self._shared:
+            self._data = bytearray(self._data)
+            self._shared = False
+
+        self._data[i] = code
+
+    def snapshot(self):
+        ret = CompactBoard.__new__(CompactBoard)
+        ret._data = self._data
+
+        ret._shared = True
+        self._shared = True
+
+        return ret
+
+    def restore(self, snapshot):
+        self._data = snapshot._data
+
+        self._shared = True
+        snapshot._shared = True
+
+    def compact(self):
+        return self.snapshot()
+
+    def to_board(self):
+        ret = Board()
+        ret.empty()
+
+        for t, terr in self.items():
+            if terr.occupied:
+                ret.place_unit(t, terr.occupied, terr.kind, terr.coast)
+
+            if terr.owner:
+                ret.set_owner(t, terr.owner)
+
+        return ret
+
+    def __eq__(self, other):
+        if not isinstance(other, CompactBoard):
+            return NotImplemented
+
+        return self._data == other._data
+
+    __hash__ = None
+
+    def __len__(self):
+        return len(territories)
+
+    def __iter__(self):
+        return iter(territories)
+
+    def __contains__(self, t):
+        return t in territories
+
+    def __getitem__(self, t):
+        if t not in territories:
+            raise KeyError(t)
+
+        return TerritoryView(self, terr_ids[t])
+
+    def keys(self):
+        return territories
+
+    def values(self):
+        return [self[t] for t in territories]
+
+    def items(self):
+        return [(t, self[t]) for t in territories]
+
+    def _scan(self, f, nations, mask):
+        if isinstance(nations, str):
+            nations = {nations}
+
+        codes = {field_codes[f][n] for n in nations if n in field_codes[f]}
+        ret = 0
+
+        for i, code in enumerate(self._data[f * stride:(f + 1) * stride]):
+            if code in codes:
+                ret |= 1 << i
+
+        return BitSet(terr_ids, ret & mask)
+
+    def occupied(self, nations=nations):
+        return self._scan(1, nations, territories.mask)
+
+    def owned(self, nations=nations):
+        return self._scan(0, nations, supp_centers.mask)
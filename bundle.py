@@ -0,0 +1,186 @@
+  ############################################################################
+  # Diplobot - play Diplomacy through Telegram                               #
+  # Copyright (C) 2018 Simone Cimarelli a.k.a. AquilaIrreale                 #
+  #                                                                          #
+  # This program is free software: you can redistribute it and/or modify     #
+  # it under the terms of the GNU Affero General Public License as published #
+  # by the Free Software Foundation, either version 3 of the License, or     #
+  # (at your option) any later version.                                      #
+  #                                                                          #
+  # This program is distributed in the hope that it will be useful,          #
+  # but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+  # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+  # GNU Affero General Public License for more details.                      #
+  #                                                                          #
+  # You should have received a copy of the GNU Affero General Public License #
+  # along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+  ############################################################################
+
+
+import os
+import sys
+import pickle
+import hashlib
+import tempfile
+import threading
+
+from cache import private_dir, user_cache_dir
+
+
+# Everything derived from the files in assets/ is built once and kept in
+# a single file, in a directory only this user can write to, as it is
+# unpickled. Each part of it is stored with the size, mtime and hash of
+# the files it was built from, including the source of the modules that
+# built it, and is only unpickled when first asked for
+
+bundle_path = os.path.join(user_cache_dir(), "bundle")
+
+builders = {}
+parts = {}
+
+blobs = None
+lock = threading.RLock()
+
+missing = object()
+
+
+def part(name, *sources, modules=(), salt=None):
+    """Register f as the builder of a part made from the given files.
+    The source of the module defining f, and of the other modules whose
+    code the part depends on (e.g. the classes it holds), count as files
+    too. Anything else the part depends on goes in salt, whose repr is
+    checked along with the files"""
+
+    def decorator(f):
+        module_files = [sys.modules[m].__file__
+                        for m in (f.__module__,) + tuple(modules)]
+
+        builders[name] = (
+            f,
+            tuple(os.path.abspath(fn) for fn in sources + tuple(module_files)),
+            repr(salt))
+
+        return f
+
+    return decorator
+
+
+def file_hash(fn):
+    with open(fn, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def describe(sources, salt):
+    ret = {"salt": salt}
+
+    for fn in sources:
+        st = os.stat(fn)
+        ret[fn] = (st.st_mtime_ns, st.st_size, file_hash(fn))
+
+    return ret
+
+
+def check(stored, sources, salt):
+    """Return the up to date description of the sources if they are the
+    ones the part was built from, None otherwise"""
+
+    if stored.get("salt") != salt:
+        return None
+
+    ret = {"salt": salt}
+
+    for fn in sources:
+        try:
+            st = os.stat(fn)
+            mtime, size, sha = stored[fn]
+
+        except (OSError, KeyError):
+            return None
+
+        if (st.st_mtime_ns, st.st_size) != (mtime, size):
+            # Touched, but not necessarily changed (a checkout, a copy)
+            if st.st_size != size or file_hash(fn) != sha:
+                return None
+
+        ret[fn] = (st.st_mtime_ns, st.st_size, sha)
+
+    return ret
+
+
+def load():
+    global blobs
+
+    if blobs is None:
+        try:
+            private_dir(os.path.dirname(bundle_path))
+
+            with open(bundle_path, "rb") as f:
+                blobs = pickle.load(f)
+
+        except Exception:
+            blobs = {}
+
+    return blobs
+
+
+def save():
+    # The bundle is only a cache: without it everything is built again
+    try:
+        fd, tmp = tempfile.mkstemp(
+            prefix=".", dir=private_dir(os.path.dirname(bundle_path)))
+
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(blobs, f, pickle.HIGHEST_PROTOCOL)
+
+        os.replace(tmp, bundle_path)
+
+    except OSError:
+        pass
+
+
+def get(name):
+    with lock:
+        value = parts.get(name, missing)
+
+        if value is not missing:
+            return value
+
+        f, sources, salt = builders[name]
+        entry = load().get(name)
+
+        if entry is not None:
+            stored, data = entry
+            current = check(stored, sources, salt)
+
+            if current is not None:
+                try:
+                    value = pickle.loads(data)
+                except Exception:
+                    value = missing
+
+            if value is not missing and current != stored:
+                blobs[name] = (current, data)
+                save()
+
+        if value is missing:
+            value = f()
+            blobs[name] = (
+                describe(sources, salt), pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+            save()
+
+        parts[name] = value
+
+        return value
+
+
+def clear():
+    global blobs
+
+    with lock:
+        parts.clear()
+        blobs = {}
+
+        try:
+            os.unlink(bundle_path)
+        except OSError:
+            pass
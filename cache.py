@@ -0,0 +1,250 @@
+  ############################################################################
+  # Diplobot - play Diplomacy through Telegram                               #
+  # Copyright (C) 2018 Simone Cimarelli a.k.a. AquilaIrreale                 #
+  #                                                                          #
+  # This program is free software: you can redistribute it and/or modify     #
+  # it under the terms of the GNU Affero General Public License as published #
+  # by the Free Software Foundation, either version 3 of the License, or     #
+  # (at your option) any later version.                                      #
+  #                                                                          #
+  # This program is distributed in the hope that it will be useful,          #
+  # but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+  # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+  # GNU Affero General Public License for more details.                      #
+  #                                                                          #
+  # You should have received a copy of the GNU Affero General Public License #
+  # along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+  ############################################################################
+
+
+import os
+import stat
+import pickle
+import hashlib
+import tempfile
+import threading
+
+from collections import OrderedDict
+
+
+def digest(obj):
+    return hashlib.sha256(repr(obj).encode()).hexdigest()
+
+
+def user_cache_dir(*names):
+    home = (os.environ.get("XDG_CACHE_HOME")
+            or os.path.join(os.path.expanduser("~"), ".cache"))
+
+    return os.path.join(home, "diplobot", *names)
+
+
+def private_dir(path):
+    """Create the directory path, accessible to this user only. Whatever
+    is read back from it is trusted, so refuse to use a directory that
+    somebody else owns or can write to"""
+
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    st = os.lstat(path)
+
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid():
+        raise PermissionError("{} is not a private directory".format(path))
+
+    if st.st_mode & 0o077:
+        os.chmod(path, 0o700)
+
+    return path
+
+
+class LRUCache:
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            return self._data.pop(key, default)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class DiskCache:
+    def __init__(self, path, maxbytes=None):
+        self.path = path
+        self.maxbytes = maxbytes
+        self.written = 0
+        self._lock = threading.Lock()
+        private_dir(path)
+
+    def filename(self, key):
+        return os.path.join(self.path, key[:2], key)
+
+    def get(self, key):
+        fn = self.filename(key)
+
+        try:
+            with open(fn, "rb") as f:
+                data = f.read()
+
+        except OSError:
+            return None
+
+        if self.maxbytes:
+            # Entries are evicted oldest first, so mark this one as used
+            try:
+                os.utime(fn)
+            except OSError:
+                pass
+
+        return data
+
+    def put(self, key, data):
+        fn = self.filename(key)
+        os.makedirs(os.path.dirname(fn), exist_ok=True)
+
+        # Write and rename, so that concurrent readers never see half a file
+        fd, tmp = tempfile.mkstemp(prefix=".", dir=os.path.dirname(fn))
+
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+
+        os.replace(tmp, fn)
+
+        if not self.maxbytes:
+            return
+
+        with self._lock:
+            self.written += len(data)
+
+            # Other processes write here too, so only the directory itself
+            # knows how big the cache is: scan it every so often
+            if self.written < self.maxbytes // 8:
+                return
+
+            self.written = 0
+
+        self.prune()
+
+    def prune(self):
+        entries = []
+        total = 0
+
+        for d in os.scandir(self.path):
+            if not d.is_dir():
+                continue
+
+            for f in os.scandir(d.path):
+                if f.name.startswith("."):
+                    # Still being written
+                    continue
+
+                try:
+                    st = f.stat()
+                except OSError:
+                    continue
+
+                entries.append((st.st_mtime, st.st_size, f.path))
+                total += st.st_size
+
+        entries.sort()
+
+        for mtime, size, fn in entries:
+            if total <= self.maxbytes:
+                break
+
+            try:
+                os.unlink(fn)
+            except OSError:
+                pass
+
+            total -= size
+
+
+class TieredCache:
+    def __init__(self, maxsize, path=None,
+                 dumps=pickle.dumps, loads=pickle.loads, maxbytes=None):
+
+        self.memory = LRUCache(maxsize)
+        self.disk = DiskCache(path, maxbytes) if path else None
+        self.dumps = dumps
+        self.loads = loads
+
+        # The tiers have locks of their own: this one is for the counters,
+        # and for whatever the users of the cache count along with them
+        self.lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.memory.get(key)
+
+        if value is not None:
+            with self.lock:
+                self.hits += 1
+
+            return value
+
+        if self.disk:
+            data = self.disk.get(key)
+
+            if data is not None:
+                try:
+                    value = self.loads(data)
+                except Exception:
+                    value = None
+
+            if value is not None:
+                with self.lock:
+                    self.disk_hits += 1
+
+                self.memory.put(key, value)
+                return value
+
+        with self.lock:
+            self.misses += 1
+
+        return None
+
+    def put(self, key, value):
+        self.memory.put(key, value)
+
+        if self.disk:
+            self.disk.put(key, self.dumps(value))
+
+    def stats(self):
+        with self.lock:
+            hits, disk_hits, misses = self.hits, self.disk_hits, self.misses
+
+        lookups = hits + disk_hits + misses
+
+        return {
+            "hits": hits,
+            "disk_hits": disk_hits,
+            "misses": misses,
+            "hit_rate": (hits + disk_hits) / lookups if lookups else 0.0,
+            "entries": len(self.memory)
+        }
@@ -0,0 +1,992 @@
+#!/usr/bin/env python3
+
+  ############################################################################
+  # Diplobot - play Diplomacy through Telegram                               #
+  # Copyright (C) 2018 Simone Cimarelli a.k.a. AquilaIrreale                 #
+  #                                                                          #
+  # This program is free software: you can redistribute it and/or modify     #
+  # it under the terms of the GNU Affero General Public License as published #
+  # by the Free Software Foundation, either version 3 of the License, or     #
+  # (at your option) any later version.                                      #
+  #                                                                          #
+  # This program is distributed in the hope that it will be useful,          #
+  # but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+  # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+  # GNU Affero General Public License for more details.                      #
+  #                                                                          #
+  # You should have received a copy of the GNU Affero General Public License #
+  # along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+  ############################################################################
+
+
+# DATC (Diplomacy Adjudicator Test Cases) conformance and throughput
+# benchmark for the adjudication backends.
+#
+# Each case lists the units on the board, the orders and the expected
+# outcome of every order: S (succeeds), F (fails) or ? (don't care).
+# Supports succeed when they are not cut, convoys when the fleet is not
+# dislodged and holds when the unit is not dislodged, like cdippy reports
+# them. Cases may also list the dislodged units and their retreat options.
+#
+# Run from the repository root: ./datc.py [--backend NAME] [--iterations N]
+
+import re
+import sys
+import json
+import time
+import argparse
+
+import adjudicator
+
+from board import Board
+from order import parse_order
+
+
+cases = [
+    ("6.A.1", "Moving to an area that is not a neighbour",
+     ["ENGLAND F NTH"],
+     ["NTH-Pic"], "F"),
+
+    ("6.A.2", "Move army to sea",
+     ["ENGLAND A Lvp"],
+     ["Lvp-IRI"], "F"),
+
+    ("6.A.3", "Move fleet to land",
+     ["GERMANY F Kie"],
+     ["Kie-Mun"], "F"),
+
+    ("6.A.4", "Move to own sector",
+     ["GERMANY F Kie"],
+     ["Kie-Kie"], "F"),
+
+    ("6.A.5", "Move to own sector with convoy",
+     ["ENGLAND F NTH", "ENGLAND A Yor", "ENGLAND A Lvp",
+      "GERMANY F Lon", "GERMANY A Wal"],
+     ["NTH C Yor-Yor", "Yor-Yor", "Lvp S Yor-Yor", "Lon-Yor", "Wal S Lon-Yor"],
+     "?F?SS", {"Yor"}),
+
+    ("6.A.7", "Only armies can be convoyed",
+     ["ENGLAND F Lon", "ENGLAND F NTH"],
+     ["Lon-Bel", "NTH C Lon-Bel"], "F?"),
+
+    ("6.A.8", "Support to hold yourself is not possible",
+     ["ITALY A Ven", "ITALY A Tyr", "AUSTRIA F Tri"],
+     ["Ven-Tri", "Tyr S Ven-Tri", "Tri S Tri"], "SSF", {"Tri"}),
+
+    ("6.A.9", "Fleets must follow coast if not on sea",
+     ["ITALY F Rom"],
+     ["Rom-Ven"], "F"),
+
+    ("6.A.10", "Support on unreachable destination not possible",
+     ["AUSTRIA A Ven", "ITALY F Rom", "ITALY A Apu"],
+     ["Ven H", "Rom S Apu-Ven", "Apu-Ven"], "SFF"),
+
+    ("6.A.11", "Simple bounce",
+     ["AUSTRIA A Vie", "ITALY A Ven"],
+     ["Vie-Tyr", "Ven-Tyr"], "FF"),
+
+    ("6.A.12", "Bounce of three units",
+     ["AUSTRIA A Vie", "GERMANY A Mun", "ITALY A Ven"],
+     ["Vie-Tyr", "Mun-Tyr", "Ven-Tyr"], "FFF"),
+
+    ("6.B.1", "Moving with unspecified coast when coast is necessary",
+     ["FRANCE F Por"],
+     ["Por-Spa"], "F"),
+
+    ("6.B.2", "Moving with unspecified coast when coast is not necessary",
+     ["FRANCE F Gas"],
+     ["Gas-Spa"], "S"),
+
+    ("6.B.3", "Moving with wrong coast when coast is not necessary",
+     ["FRANCE F Gas"],
+     ["Gas-Spa(SC)"], "F"),
+
+    ("6.B.4", "Support to unreachable coast allowed",
+     ["FRANCE F Gas", "FRANCE F Mar", "ITALY F WES"],
+     ["Gas-Spa(NC)", "Mar S Gas-Spa", "WES-Spa(SC)"], "SSF"),
+
+    ("6.B.5", "Support from unreachable coast not allowed",
+     ["FRANCE F Mar", "FRANCE F Spa(NC)", "ITALY F LYO"],
+     ["Mar-LYO", "Spa S Mar-LYO", "LYO H"], "FFS"),
+
+    ("6.B.6", "Support can be cut with other coast",
+     ["ENGLAND F IRI", "ENGLAND F NAO", "FRANCE F Spa(NC)", "FRANCE F MAO",
+      "ITALY F LYO"],
+     ["IRI S NAO-MAO", "NAO-MAO", "Spa S MAO", "MAO H", "LYO-Spa(SC)"],
+     "SSFFF", {"MAO"}),
+
+    # Ruling: support orders carry no coast here at all, so a support to
+    # either coast matches the move (DATC prefers this, see 4.B.4). 6.B.9,
+    # a support naming the wrong coast, can't be written down
+    ("6.B.7", "Supporting with unspecified coast",
+     ["FRANCE F Por", "FRANCE F MAO", "ITALY F LYO", "ITALY F WES"],
+     ["Por S MAO-Spa", "MAO-Spa(NC)", "LYO S WES-Spa(SC)", "WES-Spa(SC)"],
+     "SFSF"),
+
+    ("6.B.8", "Supporting with unspecified coast when only one coast is possible",
+     ["FRANCE F Por", "FRANCE F Gas", "ITALY F LYO", "ITALY F WES"],
+     ["Por S Gas-Spa", "Gas-Spa(NC)", "LYO S WES-Spa(SC)", "WES-Spa(SC)"],
+     "SFSF"),
+
+    # Ruling: the coast of the ordered unit is never part of the order,
+    # it comes from the board, so 6.B.10 is a plain move and 6.B.11 a
+    # move from the coast the fleet is really on
+    ("6.B.10", "Unit ordered with wrong coast",
+     ["FRANCE F Spa(SC)"],
+     ["Spa-LYO"], "S"),
+
+    ("6.B.11", "Coast can not be ordered to change",
+     ["FRANCE F Spa(NC)"],
+     ["Spa-LYO"], "F"),
+
+    # Ruling: the coast of an army move is ignored (DATC preference)
+    ("6.B.12", "Army movement with coastal specification",
+     ["FRANCE A Gas"],
+     ["Gas-Spa(NC)"], "S"),
+
+    ("6.B.13", "Coastal crawl not allowed",
+     ["TURKEY F Bul(SC)", "TURKEY F Con"],
+     ["Bul-Con", "Con-Bul(NC)"], "FF"),
+
+    ("6.C.1", "Three army circular movement",
+     ["TURKEY F Ank", "TURKEY A Con", "TURKEY A Smy"],
+     ["Ank-Con", "Con-Smy", "Smy-Ank"], "SSS"),
+
+    ("6.C.2", "Three army circular movement with support",
+     ["TURKEY F Ank", "TURKEY A Con", "TURKEY A Smy", "TURKEY A Bul"],
+     ["Ank-Con", "Con-Smy", "Smy-Ank", "Bul S Ank-Con"], "SSSS"),
+
+    ("6.C.3", "A disrupted three army circular movement",
+     ["TURKEY F Ank", "TURKEY A Con", "TURKEY A Smy", "TURKEY A Bul"],
+     ["Ank-Con", "Con-Smy", "Smy-Ank", "Bul-Con"], "FFFF"),
+
+    ("6.C.4", "A circular movement with attacked convoy",
+     ["AUSTRIA A Tri", "AUSTRIA A Ser", "TURKEY A Bul", "TURKEY F AEG",
+      "TURKEY F ION", "TURKEY F ADR", "ITALY F Nap"],
+     ["Tri-Ser", "Ser-Bul", "Bul-Tri", "AEG C Bul-Tri", "ION C Bul-Tri",
+      "ADR C Bul-Tri", "Nap-ION"], "SSSSSSF"),
+
+    ("6.C.5", "A disrupted circular movement due to dislodged convoy",
+     ["AUSTRIA A Tri", "AUSTRIA A Ser", "TURKEY A Bul", "TURKEY F AEG",
+      "TURKEY F ION", "TURKEY F ADR", "ITALY F Nap", "ITALY F Tun"],
+     ["Tri-Ser", "Ser-Bul", "Bul-Tri", "AEG C Bul-Tri", "ION C Bul-Tri",
+      "ADR C Bul-Tri", "Nap-ION", "Tun S Nap-ION"], "FFFSFSSS", {"ION"}),
+
+    ("6.C.6", "Two armies with two convoys",
+     ["ENGLAND F NTH", "ENGLAND A Lon", "FRANCE F ENG", "FRANCE A Bel"],
+     ["NTH C Lon-Bel", "Lon-Bel", "ENG C Bel-Lon", "Bel-Lon"], "SSSS"),
+
+    ("6.C.7", "Disrupted unit swap",
+     ["ENGLAND F NTH", "ENGLAND A Lon", "FRANCE F ENG", "FRANCE A Bel",
+      "FRANCE A Bur"],
+     ["NTH C Lon-Bel", "Lon-Bel", "ENG C Bel-Lon", "Bel-Lon", "Bur-Bel"],
+     "SFSFF"),
+
+    ("6.D.1", "Supported hold can prevent dislodgement",
+     ["AUSTRIA F ADR", "AUSTRIA A Tri", "ITALY A Ven", "ITALY A Tyr"],
+     ["ADR S Tri-Ven", "Tri-Ven", "Ven H", "Tyr S Ven"], "SFSS"),
+
+    ("6.D.2", "A move cuts support on hold",
+     ["AUSTRIA F ADR", "AUSTRIA A Tri", "AUSTRIA A Vie", "ITALY A Ven",
+      "ITALY A Tyr"],
+     ["ADR S Tri-Ven", "Tri-Ven", "Vie-Tyr", "Ven H", "Tyr S Ven"],
+     "SSFFF", {"Ven"}),
+
+    ("6.D.3", "A move cuts support on move",
+     ["AUSTRIA F ADR", "AUSTRIA A Tri", "ITALY A Ven", "ITALY F ION"],
+     ["ADR S Tri-Ven", "Tri-Ven", "Ven H", "ION-ADR"], "FFSF"),
+
+    ("6.D.4", "Support to hold on unit supporting a hold allowed",
+     ["GERMANY A Ber", "GERMANY F Kie", "RUSSIA F BAL", "RUSSIA A Pru"],
+     ["Ber S Kie", "Kie S Ber", "BAL S Pru-Ber", "Pru-Ber"], "FSSF"),
+
+    ("6.D.5", "Support to hold on unit supporting a move allowed",
+     ["GERMANY A Ber", "GERMANY F Kie", "GERMANY A Mun", "RUSSIA F BAL",
+      "RUSSIA A Pru"],
+     ["Ber S Mun-Sil", "Kie S Ber", "Mun-Sil", "BAL S Pru-Ber", "Pru-Ber"],
+     "FSSSF"),
+
+    ("6.D.6", "Support to hold on convoying unit allowed",
+     ["GERMANY A Ber", "GERMANY F BAL", "GERMANY F Pru", "RUSSIA F Lvn",
+      "RUSSIA F BOT"],
+     ["Ber-Swe", "BAL C Ber-Swe", "Pru S BAL", "Lvn-BAL", "BOT S Lvn-BAL"],
+     "SSSFS"),
+
+    ("6.D.7", "Support to hold on moving unit not allowed",
+     ["GERMANY F BAL", "GERMANY F Pru", "RUSSIA F Lvn", "RUSSIA F BOT",
+      "RUSSIA A Fin"],
+     ["BAL-Swe", "Pru S BAL", "Lvn-BAL", "BOT S Lvn-BAL", "Fin-Swe"],
+     "FFSSF", {"BAL"}),
+
+    ("6.D.8", "Failed convoy can not receive hold support",
+     ["AUSTRIA F ION", "AUSTRIA A Ser", "AUSTRIA A Alb", "TURKEY A Gre",
+      "TURKEY A Bul"],
+     ["ION H", "Ser S Alb-Gre", "Alb-Gre", "Gre-Nap", "Bul S Gre"],
+     "SSSFF", {"Gre"}),
+
+    ("6.D.9", "Support to move on holding unit not allowed",
+     ["ITALY A Ven", "ITALY A Tyr", "AUSTRIA A Alb", "AUSTRIA A Tri"],
+     ["Ven-Tri", "Tyr S Ven-Tri", "Alb S Tri-Ser", "Tri H"],
+     "SSFF", {"Tri"}),
+
+    ("6.D.10", "Self dislodgment prohibited",
+     ["GERMANY A Ber", "GERMANY F Kie", "GERMANY A Mun"],
+     ["Ber H", "Kie-Ber", "Mun S Kie-Ber"], "SFS"),
+
+    ("6.D.11", "No self dislodgment of returning unit",
+     ["GERMANY A Ber", "GERMANY F Kie", "GERMANY A Mun", "RUSSIA A War"],
+     ["Ber-Pru", "Kie-Ber", "Mun S Kie-Ber", "War-Pru"], "FFSF"),
+
+    ("6.D.12", "Supporting a foreign unit to dislodge own unit prohibited",
+     ["AUSTRIA F Tri", "AUSTRIA A Vie", "ITALY A Ven"],
+     ["Tri H", "Vie S Ven-Tri", "Ven-Tri"], "SSF"),
+
+    ("6.D.13", "Supporting a foreign unit to dislodge a returning own unit "
+               "prohibited",
+     ["AUSTRIA F Tri", "AUSTRIA A Vie", "ITALY A Ven", "ITALY F Apu"],
+     ["Tri-ADR", "Vie S Ven-Tri", "Ven-Tri", "Apu-ADR"], "FSFF"),
+
+    ("6.D.14", "Supporting a foreign unit is not enough to prevent "
+               "dislodgement",
+     ["AUSTRIA F Tri", "AUSTRIA A Vie", "ITALY A Ven", "ITALY A Tyr",
+      "ITALY F ADR"],
+     ["Tri H", "Vie S Ven-Tri", "Ven-Tri", "Tyr S Ven-Tri", "ADR S Ven-Tri"],
+     "FSSSS", {"Tri"}),
+
+    ("6.D.15", "Defender can not cut support for attack on itself",
+     ["RUSSIA F Con", "RUSSIA F BLA", "TURKEY F Ank"],
+     ["Con S BLA-Ank", "BLA-Ank", "Ank-Con"], "SSF", {"Ank"}),
+
+    ("6.D.16", "Convoying a unit dislodging a unit of same power is allowed",
+     ["ENGLAND A Lon", "ENGLAND F NTH", "FRANCE F ENG", "FRANCE A Bel"],
+     ["Lon H", "NTH C Bel-Lon", "ENG S Bel-Lon", "Bel-Lon"],
+     "FSSS", {"Lon"}),
+
+    ("6.D.17", "Dislodgement cuts supports",
+     ["RUSSIA F Con", "RUSSIA F BLA", "TURKEY F Ank", "TURKEY A Smy",
+      "TURKEY A Arm"],
+     ["Con S BLA-Ank", "BLA-Ank", "Ank-Con", "Smy S Ank-Con", "Arm-Ank"],
+     "FFSSF", {"Con"}),
+
+    ("6.D.18", "A surviving unit will sustain support",
+     ["RUSSIA F Con", "RUSSIA F BLA", "RUSSIA A Bul", "TURKEY F Ank",
+      "TURKEY A Smy", "TURKEY A Arm"],
+     ["Con S BLA-Ank", "BLA-Ank", "Bul S Con", "Ank-Con", "Smy S Ank-Con",
+      "Arm-Ank"],
+     "SSSFSF", {"Ank"}),
+
+    ("6.D.19", "Even when surviving is in alternative way",
+     ["RUSSIA F Con", "RUSSIA F BLA", "RUSSIA A Smy", "TURKEY F Ank"],
+     ["Con S BLA-Ank", "BLA-Ank", "Smy S Ank-Con", "Ank-Con"],
+     "SSSF", {"Ank"}),
+
+    ("6.D.20", "Unit can not cut support of its own country",
+     ["ENGLAND F Lon", "ENGLAND F NTH", "ENGLAND A Yor", "FRANCE F ENG"],
+     ["Lon S NTH-ENG", "NTH-ENG", "Yor-Lon", "ENG H"], "SSFF", {"ENG"}),
+
+    ("6.D.21", "Dislodging does not cancel a support cut",
+     ["AUSTRIA F Tri", "ITALY A Ven", "ITALY A Tyr", "GERMANY A Mun",
+      "RUSSIA A Sil", "RUSSIA A Ber"],
+     ["Tri H", "Ven-Tri", "Tyr S Ven-Tri", "Mun-Tyr", "Sil-Mun",
+      "Ber S Sil-Mun"],
+     "SFFFSS", {"Mun"}),
+
+    ("6.D.22", "Impossible fleet move can not be supported",
+     ["GERMANY F Kie", "GERMANY A Bur", "RUSSIA A Mun", "RUSSIA A Ber"],
+     ["Kie-Mun", "Bur S Kie-Mun", "Mun-Kie", "Ber S Mun-Kie"],
+     "FFSS", {"Kie"}),
+
+    ("6.D.23", "Impossible coast move can not be supported",
+     ["ITALY F LYO", "ITALY F WES", "FRANCE F Spa(NC)", "FRANCE F Mar"],
+     ["LYO-Spa(SC)", "WES S LYO-Spa(SC)", "Spa-LYO", "Mar S Spa-LYO"],
+     "SSFF", {"Spa"}),
+
+    ("6.D.24", "Impossible army move can not be supported",
+     ["FRANCE A Mar", "FRANCE F Spa(SC)", "ITALY F LYO", "TURKEY F TYS",
+      "TURKEY F WES"],
+     ["Mar-LYO", "Spa S Mar-LYO", "LYO H", "TYS S WES-LYO", "WES-LYO"],
+     "FFFSS", {"LYO"}),
+
+    ("6.D.25", "Failing hold support can be supported",
+     ["GERMANY A Ber", "GERMANY F Kie", "RUSSIA F BAL", "RUSSIA A Pru"],
+     ["Ber S Pru", "Kie S Ber", "BAL S Pru-Ber", "Pru-Ber"], "FSSF"),
+
+    ("6.D.26", "Failing move support can be supported",
+     ["GERMANY A Ber", "GERMANY F Kie", "RUSSIA F BAL", "RUSSIA A Pru"],
+     ["Ber S Pru-Sil", "Kie S Ber", "BAL S Pru-Ber", "Pru-Ber"], "FSSF"),
+
+    ("6.D.27", "Failing convoy can be supported",
+     ["ENGLAND F Swe", "ENGLAND F Den", "GERMANY A Ber", "RUSSIA F BAL",
+      "RUSSIA F Pru"],
+     ["Swe-BAL", "Den S Swe-BAL", "Ber H", "BAL C Ber-Lvn", "Pru S BAL"],
+     "FSSFS"),
+
+    ("6.D.28", "Impossible move and support",
+     ["AUSTRIA A Bud", "RUSSIA F Rum", "TURKEY F BLA", "TURKEY A Bul"],
+     ["Bud S Rum", "Rum-Hol", "BLA-Rum", "Bul S BLA-Rum"], "SFFS"),
+
+    ("6.D.29", "Move to impossible coast and support",
+     ["AUSTRIA A Bud", "RUSSIA F Rum", "TURKEY F BLA", "TURKEY A Bul"],
+     ["Bud S Rum", "Rum-Bul(SC)", "BLA-Rum", "Bul S BLA-Rum"], "SFFS"),
+
+    ("6.D.30", "Move without coast and support",
+     ["ITALY F AEG", "RUSSIA F Con", "TURKEY F BLA", "TURKEY A Bul"],
+     ["AEG S Con", "Con-Bul", "BLA-Con", "Bul S BLA-Con"], "SFFS"),
+
+    # Ruling: whether the support is possible doesn't matter, as there is
+    # no convoy for the army anyway
+    ("6.D.31", "A tricky impossible support",
+     ["AUSTRIA A Rum", "TURKEY F BLA"],
+     ["Rum-Arm", "BLA S Rum-Arm"], "F?"),
+
+    # Ruling: with no fleet that could convoy it, the move to Holland is
+    # impossible, so Yorkshire holds and can receive hold support (DATC
+    # 4.E.1). Compare 6.D.8, where a fleet could have convoyed the army
+    ("6.D.32", "A missing fleet",
+     ["ENGLAND F Edi", "ENGLAND A Lvp", "FRANCE F Lon", "GERMANY A Yor"],
+     ["Edi S Lvp-Yor", "Lvp-Yor", "Lon S Yor", "Yor-Hol"], "SFSF", set()),
+
+    ("6.D.33", "Unwanted support allowed",
+     ["AUSTRIA A Ser", "AUSTRIA A Vie", "RUSSIA A Gal", "TURKEY A Bul"],
+     ["Ser-Bud", "Vie-Bud", "Gal S Ser-Bud", "Bul-Ser"], "SFSS"),
+
+    ("6.D.34", "Support targeting own area not allowed",
+     ["GERMANY A Ber", "GERMANY A Sil", "GERMANY F BAL", "ITALY A Pru",
+      "RUSSIA A War", "RUSSIA A Lvn"],
+     ["Ber-Pru", "Sil S Ber-Pru", "BAL S Ber-Pru", "Pru S Lvn-Pru",
+      "War S Lvn-Pru", "Lvn-Pru"],
+     "SSSFSF", {"Pru"}),
+
+    ("6.E.1", "Dislodged unit has no effect on attacker's area",
+     ["GERMANY A Ber", "GERMANY F Kie", "GERMANY A Sil", "RUSSIA A Pru"],
+     ["Ber-Pru", "Kie-Ber", "Sil S Ber-Pru", "Pru-Ber"], "SSSF", {"Pru"}),
+
+    ("6.E.2", "No self dislodgement in head to head battle",
+     ["GERMANY A Ber", "GERMANY F Kie", "GERMANY A Mun"],
+     ["Ber-Kie", "Kie-Ber", "Mun S Ber-Kie"], "FFS"),
+
+    ("6.E.3", "No help in dislodging own unit",
+     ["GERMANY A Ber", "GERMANY A Mun", "ENGLAND F Kie"],
+     ["Ber-Kie", "Mun S Kie-Ber", "Kie-Ber"], "FSF"),
+
+    ("6.E.4", "Non-dislodged loser has still effect",
+     ["GERMANY F Hol", "GERMANY F HEL", "GERMANY F SKA", "FRANCE F NTH",
+      "FRANCE F Bel", "ENGLAND F Edi", "ENGLAND F Yor", "ENGLAND F NWG",
+      "AUSTRIA A Kie", "AUSTRIA A Ruh"],
+     ["Hol-NTH", "HEL S Hol-NTH", "SKA S Hol-NTH", "NTH-Hol", "Bel S NTH-Hol",
+      "Edi S NWG-NTH", "Yor S NWG-NTH", "NWG-NTH", "Kie S Ruh-Hol",
+      "Ruh-Hol"],
+     "FSSFSSSFSF"),
+
+    ("6.E.5", "Loser dislodged by another army has still effect",
+     ["GERMANY F Hol", "GERMANY F HEL", "GERMANY F SKA", "FRANCE F NTH",
+      "FRANCE F Bel", "ENGLAND F Edi", "ENGLAND F Yor", "ENGLAND F NWG",
+      "ENGLAND F Lon", "AUSTRIA A Kie", "AUSTRIA A Ruh"],
+     ["Hol-NTH", "HEL S Hol-NTH", "SKA S Hol-NTH", "NTH-Hol", "Bel S NTH-Hol",
+      "Edi S NWG-NTH", "Yor S NWG-NTH", "NWG-NTH", "Lon S NWG-NTH",
+      "Kie S Ruh-Hol", "Ruh-Hol"],
+     "FSSFSSSSSSF", {"NTH"}),
+
+    ("6.E.6", "Not dislodge because of own support has still effect",
+     ["GERMANY F Hol", "GERMANY F HEL", "FRANCE F NTH", "FRANCE F Bel",
+      "FRANCE F ENG", "AUSTRIA A Kie", "AUSTRIA A Ruh"],
+     ["Hol-NTH", "HEL S Hol-NTH", "NTH-Hol", "Bel S NTH-Hol",
+      "ENG S Hol-NTH", "Kie S Ruh-Hol", "Ruh-Hol"],
+     "FSFSSSF"),
+
+    ("6.E.7", "No self dislodgement with beleaguered garrison",
+     ["ENGLAND F NTH", "ENGLAND F Yor", "GERMANY F Hol", "GERMANY F HEL",
+      "RUSSIA F SKA", "RUSSIA F Nwy"],
+     ["NTH H", "Yor S Nwy-NTH", "Hol S HEL-NTH", "HEL-NTH", "SKA S Nwy-NTH",
+      "Nwy-NTH"],
+     "SSSFSF"),
+
+    ("6.E.9", "Almost self dislodgement with beleaguered garrison",
+     ["ENGLAND F NTH", "ENGLAND F Yor", "GERMANY F Hol", "GERMANY F HEL",
+      "RUSSIA F SKA", "RUSSIA F Nwy"],
+     ["NTH-NWG", "Yor S Nwy-NTH", "Hol S HEL-NTH", "HEL-NTH",
+      "SKA S Nwy-NTH", "Nwy-NTH"],
+     "SSSFSS"),
+
+    ("6.E.10", "Almost circular movement with no self dislodgement with "
+               "beleaguered garrison",
+     ["ENGLAND F NTH", "ENGLAND F Yor", "GERMANY F Hol", "GERMANY F HEL",
+      "GERMANY F Den", "RUSSIA F SKA", "RUSSIA F Nwy"],
+     ["NTH-Den", "Yor S Nwy-NTH", "Hol S HEL-NTH", "HEL-NTH", "Den-HEL",
+      "SKA S Nwy-NTH", "Nwy-NTH"],
+     "FSSFFSF"),
+
+    ("6.E.12", "Support on attack on own unit can be used for other means",
+     ["AUSTRIA A Bud", "AUSTRIA A Ser", "ITALY A Vie", "RUSSIA A Gal",
+      "RUSSIA A Rum"],
+     ["Bud-Rum", "Ser S Vie-Bud", "Vie-Bud", "Gal-Bud", "Rum S Gal-Bud"],
+     "FSFFS"),
+
+    ("6.E.13", "Three way beleaguered garrison",
+     ["ENGLAND F Edi", "ENGLAND F Yor", "FRANCE F Bel", "FRANCE F ENG",
+      "GERMANY F NTH", "RUSSIA F NWG", "RUSSIA F Nwy"],
+     ["Edi S Yor-NTH", "Yor-NTH", "Bel-NTH", "ENG S Bel-NTH", "NTH H",
+      "NWG-NTH", "Nwy S NWG-NTH"],
+     "SFFSSFS"),
+
+    ("6.E.14", "Illegal head to head battle can still defend",
+     ["ENGLAND A Lvp", "RUSSIA F Edi"],
+     ["Lvp-Edi", "Edi-Lvp"], "FF"),
+
+    ("6.E.15", "The friendly head to head battle",
+     ["ENGLAND F Hol", "ENGLAND A Ruh", "FRANCE A Kie", "FRANCE A Mun",
+      "FRANCE A Sil", "GERMANY A Ber", "GERMANY F Den", "GERMANY F HEL",
+      "RUSSIA F BAL", "RUSSIA A Pru"],
+     ["Hol S Ruh-Kie", "Ruh-Kie", "Kie-Ber", "Mun S Kie-Ber", "Sil S Kie-Ber",
+      "Ber-Kie", "Den S Ber-Kie", "HEL S Ber-Kie", "BAL S Pru-Ber", "Pru-Ber"],
+     "SFFSSFSSSF", set()),
+
+    ("6.F.1", "No convoy in coastal areas",
+     ["TURKEY A Gre", "TURKEY F AEG", "TURKEY F Con", "TURKEY F BLA"],
+     ["Gre-Sev", "AEG C Gre-Sev", "Con C Gre-Sev", "BLA C Gre-Sev"],
+     "F?F?"),
+
+    ("6.F.2", "An army being convoyed can bounce as normal",
+     ["ENGLAND F ENG", "ENGLAND A Lon", "FRANCE A Par"],
+     ["ENG C Lon-Bre", "Lon-Bre", "Par-Bre"], "SFF"),
+
+    ("6.F.3", "An army being convoyed can receive support",
+     ["ENGLAND F ENG", "ENGLAND A Lon", "ENGLAND F MAO", "FRANCE A Par"],
+     ["ENG C Lon-Bre", "Lon-Bre", "MAO S Lon-Bre", "Par-Bre"], "SSSF"),
+
+    ("6.F.4", "An attacked convoy is not disrupted",
+     ["ENGLAND F NTH", "ENGLAND A Lon", "GERMANY F SKA"],
+     ["NTH C Lon-Hol", "Lon-Hol", "SKA-NTH"], "SSF"),
+
+    ("6.F.5", "A beleaguered convoy is not disrupted",
+     ["ENGLAND F NTH", "ENGLAND A Lon", "FRANCE F ENG", "FRANCE F Bel",
+      "GERMANY F SKA", "GERMANY F Den"],
+     ["NTH C Lon-Hol", "Lon-Hol", "ENG-NTH", "Bel S ENG-NTH", "SKA-NTH",
+      "Den S SKA-NTH"],
+     "SSFSFS"),
+
+    ("6.F.6", "Dislodged convoy does not cut support",
+     ["ENGLAND F NTH", "ENGLAND A Lon", "GERMANY A Hol", "GERMANY A Bel",
+      "GERMANY F HEL", "GERMANY F SKA", "FRANCE A Pic", "FRANCE A Bur"],
+     ["NTH C Lon-Hol", "Lon-Hol", "Hol S Bel", "Bel S Hol", "HEL S SKA-NTH",
+      "SKA-NTH", "Pic-Bel", "Bur S Pic-Bel"],
+     "FFSFSSFS", {"NTH"}),
+
+    ("6.F.7", "Dislodged convoy does not cause contested area",
+     ["ENGLAND F NTH", "ENGLAND A Lon", "GERMANY F HEL", "GERMANY F SKA"],
+     ["NTH C Lon-Hol", "Lon-Hol", "HEL S SKA-NTH", "SKA-NTH"],
+     "FFSS", {"NTH": {"Bel", "Den", "Edi", "ENG", "Hol", "NWG", "Nwy", "Yor"}}),
+
+    ("6.F.8", "Dislodged convoy does not cause a bounce",
+     ["ENGLAND F NTH", "ENGLAND A Lon", "GERMANY F HEL", "GERMANY F SKA",
+      "GERMANY A Bel"],
+     ["NTH C Lon-Hol", "Lon-Hol", "HEL S SKA-NTH", "SKA-NTH", "Bel-Hol"],
+     "FFSSS", {"NTH"}),
+
+    ("6.F.9", "Dislodge of multi-route convoy",
+     ["ENGLAND F ENG", "ENGLAND F NTH", "ENGLAND A Lon", "FRANCE F Bre",
+      "FRANCE F MAO"],
+     ["ENG C Lon-Bel", "NTH C Lon-Bel", "Lon-Bel", "Bre S MAO-ENG",
+      "MAO-ENG"],
+     "FSSSS", {"ENG"}),
+
+    ("6.F.10", "Dislodge of multi-route convoy with foreign fleet",
+     ["ENGLAND F NTH", "ENGLAND A Lon", "GERMANY F ENG", "FRANCE F Bre",
+      "FRANCE F MAO"],
+     ["NTH C Lon-Bel", "Lon-Bel", "ENG C Lon-Bel", "Bre S MAO-ENG",
+      "MAO-ENG"],
+     "SSFSS", {"ENG"}),
+
+    ("6.F.11", "Dislodge of multi-route convoy with only foreign fleets",
+     ["ENGLAND A Lon", "GERMANY F ENG", "RUSSIA F NTH", "FRANCE F Bre",
+      "FRANCE F MAO"],
+     ["Lon-Bel", "ENG C Lon-Bel", "NTH C Lon-Bel", "Bre S MAO-ENG",
+      "MAO-ENG"],
+     "SFSSS", {"ENG"}),
+
+    ("6.F.12", "Dislodged convoying fleet not on route",
+     ["ENGLAND F ENG", "ENGLAND A Lon", "ENGLAND F IRI", "FRANCE F NAO",
+      "FRANCE F MAO"],
+     ["ENG C Lon-Bel", "Lon-Bel", "IRI C Lon-Bel", "NAO S MAO-IRI",
+      "MAO-IRI"],
+     "SSFSS", {"IRI"}),
+
+    ("6.F.13", "The unwanted alternative",
+     ["ENGLAND A Lon", "ENGLAND F NTH", "FRANCE F ENG", "GERMANY F Hol",
+      "GERMANY F Den"],
+     ["Lon-Bel", "NTH C Lon-Bel", "ENG C Lon-Bel", "Hol S Den-NTH",
+      "Den-NTH"],
+     "SFSSS", {"NTH"}),
+
+    ("6.F.14", "Simple convoy paradox",
+     ["ENGLAND F Lon", "ENGLAND F Wal", "FRANCE A Bre", "FRANCE F ENG"],
+     ["Lon S Wal-ENG", "Wal-ENG", "Bre-Lon", "ENG C Bre-Lon"],
+     "SSFF", {"ENG"}),
+
+    ("6.F.15", "Simple convoy paradox with additional convoy",
+     ["ENGLAND F Lon", "ENGLAND F Wal", "FRANCE A Bre", "FRANCE F ENG",
+      "ITALY F IRI", "ITALY F MAO", "ITALY A NAf"],
+     ["Lon S Wal-ENG", "Wal-ENG", "Bre-Lon", "ENG C Bre-Lon",
+      "IRI C NAf-Wal", "MAO C NAf-Wal", "NAf-Wal"],
+     "SSFFSSS", {"ENG"}),
+
+    ("6.F.16", "Pandin's paradox",
+     ["ENGLAND F Lon", "ENGLAND F Wal", "FRANCE A Bre", "FRANCE F ENG",
+      "GERMANY F NTH", "GERMANY F Bel"],
+     ["Lon S Wal-ENG", "Wal-ENG", "Bre-Lon", "ENG C Bre-Lon",
+      "NTH S Bel-ENG", "Bel-ENG"],
+     "?FF??F", set()),
+
+    ("6.F.17", "Pandin's extended paradox",
+     ["ENGLAND F Lon", "ENGLAND F Wal", "FRANCE A Bre", "FRANCE F ENG",
+      "FRANCE F Yor", "GERMANY F NTH", "GERMANY F Bel"],
+     ["Lon S Wal-ENG", "Wal-ENG", "Bre-Lon", "ENG C Bre-Lon",
+      "Yor S Bre-Lon", "NTH S Bel-ENG", "Bel-ENG"],
+     "?FF???F", set()),
+
+    ("6.F.18", "Betrayal paradox",
+     ["ENGLAND F NTH", "ENGLAND A Lon", "ENGLAND F ENG", "FRANCE F Bel",
+      "GERMANY F HEL", "GERMANY F SKA"],
+     ["NTH C Lon-Bel", "Lon-Bel", "ENG S Lon-Bel", "Bel S NTH",
+      "HEL S SKA-NTH", "SKA-NTH"],
+     "?F????", set()),
+
+    ("6.F.19", "Multi-route convoy disruption paradox",
+     ["FRANCE A Tun", "FRANCE F TYS", "FRANCE F ION", "ITALY F Nap",
+      "ITALY F Rom"],
+     ["Tun-Nap", "TYS C Tun-Nap", "ION C Tun-Nap", "Nap S Rom-TYS",
+      "Rom-TYS"],
+     "F????", set()),
+
+    ("6.G.1", "Two units can swap places by convoy",
+     ["ENGLAND A Nwy", "ENGLAND F SKA", "RUSSIA A Swe"],
+     ["Nwy-Swe C", "SKA C Nwy-Swe", "Swe-Nwy"], "SSS"),
+
+    # Ruling: an army only takes a convoy to an adjacent area when its
+    # player meant it to (DATC 4.A.3). Here that intent is always explicit:
+    # the order builder asks, and "C" after a move records the answer. The
+    # cases where DATC reads the intent from the player's own convoy
+    # orders are written with "C"
+    ("6.G.2", "Kidnapping an army",
+     ["ENGLAND A Nwy", "RUSSIA F Swe", "GERMANY F SKA"],
+     ["Nwy-Swe", "Swe-Nwy", "SKA C Nwy-Swe"], "FF?", set()),
+
+    ("6.G.3", "Kidnapping with a disrupted convoy",
+     ["FRANCE F Bre", "FRANCE A Pic", "FRANCE A Bur", "FRANCE F MAO",
+      "ENGLAND F ENG"],
+     ["Bre-ENG", "Pic-Bel", "Bur S Pic-Bel", "MAO S Bre-ENG",
+      "ENG C Pic-Bel"],
+     "SSSSF", {"ENG"}),
+
+    ("6.G.4", "Kidnapping with a disrupted convoy and opposite move",
+     ["FRANCE F Bre", "FRANCE A Pic", "FRANCE A Bur", "FRANCE F MAO",
+      "ENGLAND F ENG", "ENGLAND A Bel"],
+     ["Bre-ENG", "Pic-Bel", "Bur S Pic-Bel", "MAO S Bre-ENG",
+      "ENG C Pic-Bel", "Bel-Pic"],
+     "SSSSFF", {"ENG", "Bel"}),
+
+    ("6.G.5", "Swapping with intent",
+     ["ITALY A Rom", "ITALY F TYS", "TURKEY A Apu", "TURKEY F ION"],
+     ["Rom-Apu", "TYS C Apu-Rom", "Apu-Rom C", "ION C Apu-Rom"],
+     "SSSS", set()),
+
+    ("6.G.6", "Swapping with unintended intent",
+     ["ENGLAND A Lvp", "ENGLAND F ENG", "GERMANY A Edi", "FRANCE F IRI",
+      "FRANCE F NTH", "RUSSIA F NWG", "RUSSIA F NAO"],
+     ["Lvp-Edi C", "ENG C Lvp-Edi", "Edi-Lvp", "IRI H", "NTH H",
+      "NWG C Lvp-Edi", "NAO C Lvp-Edi"],
+     "S?SSSSS", set()),
+
+    ("6.G.7", "Swapping with illegal intent",
+     ["ENGLAND F SKA", "ENGLAND F Nwy", "RUSSIA A Swe", "RUSSIA F BOT"],
+     ["SKA C Swe-Nwy", "Nwy-Swe", "Swe-Nwy", "BOT C Swe-Nwy"],
+     "?FF?", set()),
+
+    ("6.G.8", "Explicit convoy that isn't there",
+     ["FRANCE A Bel", "ENGLAND F NTH", "ENGLAND A Hol"],
+     ["Bel-Hol C", "NTH-Hol", "Hol-Kie"], "FSS", set()),
+
+    ("6.G.9", "Swapped or dislodged?",
+     ["ENGLAND A Nwy", "ENGLAND F SKA", "ENGLAND F Fin", "RUSSIA A Swe"],
+     ["Nwy-Swe C", "SKA C Nwy-Swe", "Fin S Nwy-Swe", "Swe-Nwy"],
+     "SSSS", set()),
+
+    ("6.G.10", "Swapped or an head to head battle?",
+     ["ENGLAND A Nwy", "ENGLAND F Den", "ENGLAND F Fin", "GERMANY F SKA",
+      "RUSSIA A Swe", "RUSSIA F BAR", "FRANCE F NWG", "FRANCE F NTH"],
+     ["Nwy-Swe C", "Den S Nwy-Swe", "Fin S Nwy-Swe", "SKA C Nwy-Swe",
+      "Swe-Nwy", "BAR S Swe-Nwy", "NWG-Nwy", "NTH S NWG-Nwy"],
+     "SSSSFSFS", {"Swe": set()}),
+
+    ("6.G.11", "A convoy to an adjacent place with a paradox",
+     ["ENGLAND F Nwy", "ENGLAND F NTH", "RUSSIA A Swe", "RUSSIA F SKA",
+      "RUSSIA F BAR"],
+     ["Nwy S NTH-SKA", "NTH-SKA", "Swe-Nwy C", "SKA C Swe-Nwy",
+      "BAR S Swe-Nwy"],
+     "SSFFS", {"SKA"}),
+
+    ("6.G.12", "Swapping two units with two convoys",
+     ["ENGLAND A Lvp", "ENGLAND F NAO", "ENGLAND F NWG", "GERMANY A Edi",
+      "GERMANY F NTH", "GERMANY F ENG", "GERMANY F IRI"],
+     ["Lvp-Edi C", "NAO C Lvp-Edi", "NWG C Lvp-Edi", "Edi-Lvp C",
+      "NTH C Edi-Lvp", "ENG C Edi-Lvp", "IRI C Edi-Lvp"],
+     "SSSSSSS", set()),
+
+    ("6.G.13", "Support cut on attack on itself via convoy",
+     ["AUSTRIA F ADR", "AUSTRIA A Tri", "ITALY A Ven", "ITALY F Alb"],
+     ["ADR C Tri-Ven", "Tri-Ven C", "Ven S Alb-Tri", "Alb-Tri"],
+     "SFSS", {"Tri"}),
+
+    ("6.G.14", "Bounce by convoy to adjacent place",
+     ["ENGLAND A Nwy", "ENGLAND F Den", "ENGLAND F Fin", "FRANCE F NWG",
+      "FRANCE F NTH", "GERMANY F SKA", "RUSSIA A Swe", "RUSSIA F BAR"],
+     ["Nwy-Swe", "Den S Nwy-Swe", "Fin S Nwy-Swe", "NWG-Nwy",
+      "NTH S NWG-Nwy", "SKA C Swe-Nwy", "Swe-Nwy C", "BAR S Swe-Nwy"],
+     "SSSFSSFS", {"Swe"}),
+
+    ("6.G.15", "Bounce and dislodge with double convoy",
+     ["ENGLAND F NTH", "ENGLAND A Hol", "ENGLAND A Yor", "ENGLAND A Lon",
+      "FRANCE F ENG", "FRANCE A Bel"],
+     ["NTH C Lon-Bel", "Hol S Lon-Bel", "Yor-Lon", "Lon-Bel C",
+      "ENG C Bel-Lon", "Bel-Lon C"],
+     "SSFSSF", {"Bel"}),
+
+    ("6.G.16", "The two unit in one area bug, moving by convoy",
+     ["ENGLAND A Nwy", "ENGLAND A Den", "ENGLAND F BAL", "ENGLAND F NTH",
+      "RUSSIA A Swe", "RUSSIA F SKA", "RUSSIA F NWG"],
+     ["Nwy-Swe", "Den S Nwy-Swe", "BAL S Nwy-Swe", "NTH-Nwy",
+      "Swe-Nwy C", "SKA C Swe-Nwy", "NWG S Swe-Nwy"],
+     "SSSFSSS", set()),
+
+    ("6.G.17", "The two unit in one area bug, moving over land",
+     ["ENGLAND A Nwy", "ENGLAND A Den", "ENGLAND F BAL", "ENGLAND F SKA",
+      "ENGLAND F NTH", "RUSSIA A Swe", "RUSSIA F NWG"],
+     ["Nwy-Swe C", "Den S Nwy-Swe", "BAL S Nwy-Swe", "SKA C Nwy-Swe",
+      "NTH-Nwy", "Swe-Nwy", "NWG S Swe-Nwy"],
+     "SSSSFSS", set()),
+
+    ("6.G.18", "The two unit in one area bug, with double convoy",
+     ["ENGLAND F NTH", "ENGLAND A Hol", "ENGLAND A Yor", "ENGLAND A Lon",
+      "ENGLAND A Ruh", "FRANCE F ENG", "FRANCE A Bel", "FRANCE A Wal"],
+     ["NTH C Lon-Bel", "Hol S Lon-Bel", "Yor-Lon", "Lon-Bel",
+      "Ruh S Lon-Bel", "ENG C Bel-Lon", "Bel-Lon", "Wal S Bel-Lon"],
+     "SSFSSSSS", set()),
+
+    # 6.G.19 is the same question as 6.G.5, with an unneeded convoy, and
+    # 6.G.20 is 6.G.11 with the convoy asked for explicitly, which is how
+    # 6.G.11 is already written here
+
+    # Retreats are ordered and resolved by the bot, not by the backends, so
+    # the 6.H cases check the movement phase: who is dislodged and where
+    # they may go. The retreat orders of 6.H.1-4 and 6.H.7-8 are left out
+    ("6.H.1", "No supports during retreat",
+     ["AUSTRIA F Tri", "AUSTRIA A Ser", "TURKEY F Gre", "ITALY A Ven",
+      "ITALY A Tyr", "ITALY F ION", "ITALY F AEG"],
+     ["Tri H", "Ser H", "Gre H", "Ven S Tyr-Tri", "Tyr-Tri", "ION-Gre",
+      "AEG S ION-Gre"],
+     "FSFSSSS", {"Tri": {"ADR", "Alb"}, "Gre": {"Alb", "Bul"}}),
+
+    ("6.H.2", "No supports from retreating unit",
+     ["ENGLAND A Lvp", "ENGLAND F Yor", "ENGLAND F Nwy", "GERMANY A Kie",
+      "GERMANY A Ruh", "RUSSIA F Edi", "RUSSIA A Swe", "RUSSIA A Fin",
+      "RUSSIA F Hol"],
+     ["Lvp-Edi", "Yor S Lvp-Edi", "Nwy H", "Kie S Ruh-Hol", "Ruh-Hol",
+      "Edi H", "Swe S Fin-Nwy", "Fin-Nwy", "Hol H"],
+     "SSFSSFSSF", {"Edi": {"Cly", "NTH", "NWG"},
+                   "Nwy": {"BAR", "NTH", "NWG", "SKA", "StP"},
+                   "Hol": {"Bel", "HEL", "NTH"}}),
+
+    ("6.H.3", "No convoy during retreat",
+     ["ENGLAND F NTH", "ENGLAND A Hol", "GERMANY F Kie", "GERMANY A Ruh"],
+     ["NTH H", "Hol H", "Kie S Ruh-Hol", "Ruh-Hol"],
+     "SFSS", {"Hol": {"Bel"}}),
+
+    ("6.H.4", "No other moves during retreat",
+     ["ENGLAND F NTH", "ENGLAND A Hol", "GERMANY F Kie", "GERMANY A Ruh"],
+     ["NTH H", "Hol H", "Kie S Ruh-Hol", "Ruh-Hol"],
+     "SFSS", {"Hol": {"Bel"}}),
+
+    ("6.H.5", "A unit may not retreat to the area from which it is attacked",
+     ["RUSSIA F Con", "RUSSIA F BLA", "TURKEY F Ank"],
+     ["Con S BLA-Ank", "BLA-Ank", "Ank H"], "SSF", {"Ank": {"Arm"}}),
+
+    ("6.H.6", "Unit may not retreat to a contested area",
+     ["AUSTRIA A Bud", "AUSTRIA A Tri", "GERMANY A Mun", "GERMANY A Sil",
+      "ITALY A Vie"],
+     ["Bud S Tri-Vie", "Tri-Vie", "Mun-Boh", "Sil-Boh", "Vie H"],
+     "SSFFF", {"Vie": {"Gal", "Tyr"}}),
+
+    ("6.H.7", "Multiple retreat to same area will disband units",
+     ["AUSTRIA A Bud", "AUSTRIA A Tri", "GERMANY A Mun", "GERMANY A Sil",
+      "ITALY A Vie", "ITALY A Boh"],
+     ["Bud S Tri-Vie", "Tri-Vie", "Mun S Sil-Boh", "Sil-Boh", "Vie H",
+      "Boh H"],
+     "SSSSFF", {"Vie": {"Gal", "Tyr"}, "Boh": {"Gal", "Tyr"}}),
+
+    ("6.H.8", "Triple retreat to same area will disband units",
+     ["ENGLAND A Lvp", "ENGLAND F Yor", "ENGLAND F Nwy", "GERMANY A Kie",
+      "GERMANY A Ruh", "RUSSIA F Edi", "RUSSIA A Swe", "RUSSIA A Fin",
+      "RUSSIA F Hol"],
+     ["Lvp-Edi", "Yor S Lvp-Edi", "Nwy H", "Kie S Ruh-Hol", "Ruh-Hol",
+      "Edi H", "Swe S Fin-Nwy", "Fin-Nwy", "Hol H"],
+     "SSFSSFSSF", {"Edi", "Nwy", "Hol"}),
+
+    ("6.H.9", "Dislodged unit will not make attackers area contested",
+     ["ENGLAND F HEL", "ENGLAND F Den", "GERMANY A Ber", "GERMANY F Kie",
+      "GERMANY A Sil", "RUSSIA A Pru"],
+     ["HEL-Kie", "Den S HEL-Kie", "Ber-Pru", "Kie H", "Sil S Ber-Pru",
+      "Pru-Ber"],
+     "SSSFSF", {"Kie": {"BAL", "Ber", "Hol"}, "Pru": {"Lvn", "War"}}),
+
+    ("6.H.10", "Not retreating to attacker does not mean contested",
+     ["ENGLAND A Kie", "GERMANY A Ber", "GERMANY A Mun", "GERMANY A Pru",
+      "RUSSIA A War", "RUSSIA A Sil"],
+     ["Kie H", "Ber-Kie", "Mun S Ber-Kie", "Pru H", "War-Pru",
+      "Sil S War-Pru"],
+     "FSSFSS", {"Kie": {"Den", "Hol", "Ruh"}, "Pru": {"Ber", "Lvn"}}),
+
+    ("6.H.11", "Retreat when dislodged by adjacent convoy",
+     ["FRANCE A Gas", "FRANCE A Bur", "FRANCE F MAO", "FRANCE F WES",
+      "FRANCE F LYO", "ITALY A Mar"],
+     ["Gas-Mar C", "Bur S Gas-Mar", "MAO C Gas-Mar", "WES C Gas-Mar",
+      "LYO C Gas-Mar", "Mar H"],
+     "SSSSSF", {"Mar": {"Gas", "Pie", "Spa"}}),
+
+    ("6.H.12", "Retreat when dislodged by adjacent convoy while trying to "
+     "do the same",
+     ["ENGLAND A Lvp", "ENGLAND F IRI", "ENGLAND F ENG", "ENGLAND F NTH",
+      "FRANCE F Bre", "FRANCE F MAO", "RUSSIA A Edi", "RUSSIA F NWG",
+      "RUSSIA F NAO", "RUSSIA A Cly"],
+     ["Lvp-Edi C", "IRI C Lvp-Edi", "ENG C Lvp-Edi", "NTH C Lvp-Edi",
+      "Bre-ENG", "MAO S Bre-ENG", "Edi-Lvp C", "NWG C Edi-Lvp",
+      "NAO C Edi-Lvp", "Cly S Edi-Lvp"],
+     "F?F?SSSSSS", {"Lvp": {"Edi", "Wal", "Yor"},
+                    "ENG": {"Bel", "Lon", "Pic", "Wal"}}),
+
+    ("6.H.13", "No retreat with convoy in main phase",
+     ["ENGLAND A Pic", "ENGLAND F ENG", "FRANCE A Par", "FRANCE A Bre"],
+     ["Pic H", "ENG C Pic-Lon", "Par-Pic", "Bre S Par-Pic"],
+     "F?SS", {"Pic": {"Bel", "Bur"}}),
+
+    ("6.H.14", "No retreat with support in main phase",
+     ["ENGLAND A Pic", "ENGLAND F ENG", "FRANCE A Par", "FRANCE A Bre",
+      "FRANCE A Bur", "GERMANY A Mun", "GERMANY A Mar"],
+     ["Pic H", "ENG S Pic-Bel", "Par-Pic", "Bre S Par-Pic", "Bur H",
+      "Mun S Mar-Bur", "Mar-Bur"],
+     "F?SSFSS", {"Pic": {"Bel"}, "Bur": {"Bel", "Gas", "Par", "Ruh"}}),
+
+    ("6.H.15", "No coastal crawl in retreat",
+     ["ENGLAND F Por", "FRANCE F Spa(SC)", "FRANCE F MAO"],
+     ["Por H", "Spa-Por", "MAO S Spa-Por"], "FSS", {"Por": set()}),
+
+    ("6.H.16", "Contested for both coasts",
+     ["FRANCE F MAO", "FRANCE F Gas", "FRANCE F WES", "ITALY F Tun",
+      "ITALY F TYS"],
+     ["MAO-Spa(NC)", "Gas-Spa(NC)", "WES H", "Tun S TYS-WES", "TYS-WES"],
+     "FFFSS", {"WES": {"LYO", "NAf"}}),
+]
+
+
+units_re = re.compile(r"^(\w+) ([AF]) (\w{3})(\((?:NC|SC)\))?$")
+
+
+def setup_board(units):
+    board = Board()
+
+    board.empty()
+
+    for s in units:
+        m = units_re.match(s)
+
+        if not m:
+            raise ValueError(s)
+
+        nation, kind, t, c = m.groups()
+
+        board.place_unit(t, nation, kind, c)
+
+    return board
+
+
+def load_case(case):
+    name, title, units, orders, expected = case[:5]
+    dislodged = case[5] if len(case) > 5 else None
+
+    return (name, title, setup_board(units), [parse_order(s) for s in orders],
+            expected, dislodged)
+
+
+def check_case(board, orders, expected, dislodged, backend):
+    errors = []
+
+    try:
+        resolutions, retreats = adjudicator.adjudicate(
+            board, orders, backend, use_cache=False)
+
+    except Exception as e:
+        return ["{}: {}".format(type(e).__name__, e)]
+
+    for o, r, e in zip(orders, resolutions, expected):
+        if e != "?" and bool(r) != (e == "S"):
+            errors.append("{}: expected {}, got {}".format(
+                o, "S" if e == "S" else "F", "S" if r else "F"))
+
+    if dislodged is not None:
+        if set(retreats) != set(dislodged):
+            errors.append("dislodged: expected {}, got {}".format(
+                sorted(dislodged), sorted(retreats)))
+
+        elif isinstance(dislodged, dict):
+            for t, ts in dislodged.items():
+                if retreats[t] != ts:
+                    errors.append("{} retreats: expected {}, got {}".format(
+                        t, sorted(ts), sorted(retreats[t])))
+
+    return errors
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+
+def benchmark(loaded, backend, iterations):
+    samples = []
+
+    for _ in range(iterations):
+        for name, title, board, orders, expected, dislodged in loaded:
+            start = time.perf_counter()
+            adjudicator.adjudicate(board, orders, backend, use_cache=False)
+            samples.append(time.perf_counter() - start)
+
+    return {
+        "adjudications_per_second": len(samples) / sum(samples),
+        "p50_ms": percentile(samples, 0.50) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000
+    }
+
+
+def probe(loaded, backend):
+    name, title, board, orders, expected, dislodged = loaded[0]
+
+    try:
+        adjudicator.adjudicate(board, orders, backend, use_cache=False)
+    except Exception as e:
+        return "{}: {}".format(type(e).__name__, e)
+
+    return None
+
+
+def run_backend(loaded, backend, iterations):
+    failures = {}
+
+    for name, title, board, orders, expected, dislodged in loaded:
+        errors = check_case(board, orders, expected, dislodged, backend)
+
+        print("{:8} {:4} {}".format(name, "FAIL" if errors else "ok", title))
+
+        for e in errors:
+            print("             " + e)
+
+        if errors:
+            failures[name] = errors
+
+    ret = {
+        "passed": len(loaded) - len(failures),
+        "failed": len(failures),
+        "failures": failures
+    }
+
+    if len(failures) < len(loaded):
+        ret.update(benchmark(loaded, backend, iterations))
+
+    return ret
+
+
+def load_results(filename):
+    try:
+        with open(filename) as f:
+            return json.load(f)
+
+    except (OSError, ValueError):
+        return {"runs": []}
+
+
+def regressions(previous, current):
+    ret = []
+
+    for backend, res in current.items():
+        try:
+            prev = previous[backend]
+        except KeyError:
+            continue
+
+        for name in sorted(set(res["failures"]) - set(prev["failures"])):
+            ret.append("{}: {} used to pass".format(backend, name))
+
+        try:
+            before = prev["adjudications_per_second"]
+            after = res["adjudications_per_second"]
+        except KeyError:
+            continue
+
+        if after < before * 0.9:
+            ret.append("{}: throughput dropped from {:.0f}/s to {:.0f}/s".format(
+                backend, before, after))
+
+    return ret
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="DATC conformance and throughput benchmark")
+    parser.add_argument("--backend", action="append",
+                        help="backend to test (default: all of them)")
+    parser.add_argument("--iterations", type=int, default=20,
+                        help="benchmark passes over the whole suite")
+    parser.add_argument("--results", default="datc_results.json",
+                        help="file the results are recorded in")
+    args = parser.parse_args()
+
+    loaded = [load_case(c) for c in cases]
+    current = {}
+
+    for backend in args.backend or sorted(adjudicator.backends):
+        print("== {} ==".format(backend))
+
+        error = probe(loaded, backend)
+
+        if error is not None and not args.backend:
+            # Only a backend that was asked for explicitly counts as failing
+            print("unavailable, skipped ({})".format(error.splitlines()[0]))
+            print()
+            continue
+
+        res = run_backend(loaded, backend, args.iterations)
+        current[backend] = res
+
+        print("{} passed, {} failed".format(res["passed"], res["failed"]))
+
+        if "adjudications_per_second" in res:
+            print("{:.0f} adjudications/s, p50 {:.3f}ms, p99 {:.3f}ms".format(
+                res["adjudications_per_second"], res["p50_ms"], res["p99_ms"]))
+
+        print()
+
+    results = load_results(args.results)
+
+    if results["runs"]:
+        for r in regressions(results["runs"][-1]["backends"], current):
+            print("REGRESSION: " + r)
+
+    results["runs"].append({"time": time.time(), "backends": current})
+
+    with open(args.results, "w") as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+    if any(res["failed"] for res in current.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
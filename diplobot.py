@@ -19,7 +19,7 @@
   ############################################################################
 
 
-import os
+import io
 import re
 import random
 import pprint
@@ -27,12 +27,14 @@ import logging
 
 from operator import attrgetter, itemgetter
 from functools import partial
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 from telegram import (InlineKeyboardButton as IKB,
                       InlineKeyboardMarkup as IKM,
                       ParseMode,
                       ReplyKeyboardMarkup as RKM,
                       ReplyKeyboardRemove as RKRemove,
+                      InputMediaPhoto,
                       ChatAction)
 
 from telegram.ext import (Updater,
@@ -44,16 +46,26 @@ from telegram.ext import (Updater,
 from telegram.error import BadRequest, TimedOut
 
 from adjudicator import adjudicate
+from cache import LRUCache
 from game import find_game_by_player_id, Game
-from graphics import render_board
-from order import BuilderError, split_coasts, terr_names
+from graphics import (RenderService,
+                      compositing,
+                      order_arrows,
+                      render_key,
+                      profiles,
+                      default_profile,
+                      preview_profile)
+from order import BuilderError, parse_order, split_coasts, terr_names
 from utils import make_grid
 
 from board import (chain,
-                   full_graph,
+                   full_distances,
+                   get_coast,
                    home_centers,
                    infer_kind,
                    nations,
+                   sea_graph,
+                   strip_coast,
                    supp_centers)
 
 from guards import (group_chat,
@@ -70,20 +82,147 @@ from guards import (group_chat,
 
 
 class Diplobot:
+    adjudication_workers = 4
+    continuation_workers = 4
+    render_workers = 2
+    chat_action_interval = 4
+    board_previews = True
+    preview_backend = "native"
+    photo_ids_size = 1024
+
     def __init__(self, logger):
         self.games = {}
         self.logger = logger
 
-    def print_board(self, bot, game):
-        bot.send_chat_action(game.chat_id, ChatAction.UPLOAD_PHOTO)
+        # Adjudication happens in cdippy's own process, or is quick enough
+        # with the native engine: threads share the adjudication cache
+        self.adjudicators = ThreadPoolExecutor(self.adjudication_workers)
+        self.continuations = ThreadPoolExecutor(self.continuation_workers)
+        self.renderer = RenderService(self.render_workers)
+
+        # Telegram file_ids of the board images already uploaded, by the
+        # same key as the render cache
+        self.photo_ids = LRUCache(self.photo_ids_size)
+
+        # Output profile chosen with /image, by chat
+        self.image_profiles = {}
+
+    def shutdown(self):
+        self.adjudicators.shutdown()
+        self.continuations.shutdown()
+        self.renderer.shutdown()
+
+    def log_error(self, e, doing):
+        # For the work done off the handlers: error_handler never sees it
+        self.logger.warning("Got \"%s\" error while %s", e, doing)
+
+    def print_board(self, bot, game, then=None):
+        caption = "State of the board ({})".format(game.date())
+
+        # Rendering takes a while: send the board from another thread,
+        # as it is now, and call then() once it is out. The image is
+        # drawn again only where it differs from the last one shown
+        board = game.board.compact()
+        previous, game.shown_board = game.shown_board, board
+
+        self.continuations.submit(
+            self.send_board, bot, game.chat_id, board, previous,
+            caption, then)
+
+    def send_board(self, bot, chat_id, board, previous, caption, then):
+        try:
+            try:
+                self.send_board_photo(bot, chat_id, board, previous, caption)
+
+            finally:
+                # The game goes on even if the board couldn't be shown
+                if then is not None:
+                    then()
+
+        except Exception as e:
+            self.log_error(e, "sending the board")
+
+    def send_board_photo(self, bot, chat_id, board, previous, caption):
+        profile = self.image_profiles.get(chat_id, default_profile)
+
+        key = render_key(board, profile=profile)
+        file_id = self.photo_ids.get(key)
+
+        if file_id is not None:
+            try:
+                bot.send_photo(chat_id, file_id, caption)
+                return
+
+            except BadRequest as e:
+                # The file is gone, or the id is no good anymore: upload
+                # the image again
+                self.logger.info("Dropping file_id %s: %s", file_id, e)
+                self.photo_ids.pop(key)
+
+        bot.send_chat_action(chat_id, ChatAction.UPLOAD_PHOTO)
+
+        data = self.renderer.lookup(board, profile)
+        message = None
+
+        previews = self.board_previews and preview_profile in profiles
+
+        if data is None:
+            future = self.renderer.submit(board, profile, previous=previous)
+
+            # The preview is drawn at its own size, alongside the real
+            # board, and shown only if it's ready first. A composited board
+            # never takes longer than that, so there's no preview for it
+            if previews and profile != preview_profile and not compositing:
+                preview = self.renderer.submit(board, preview_profile)
+                self.wait_for_image(bot, chat_id, future, preview)
+
+                if not future.done() and preview.exception() is None:
+                    message = bot.send_photo(
+                        chat_id, io.BytesIO(preview.result()), caption)
 
-        board_png = render_board(game.board)
+            data = self.wait_for_image(bot, chat_id, future)
+
+        if message:
+            message = bot.edit_message_media(
+                chat_id=chat_id,
+                message_id=message.message_id,
+                media=InputMediaPhoto(io.BytesIO(data), caption=caption))
+
+        else:
+            message = bot.send_photo(chat_id, io.BytesIO(data), caption)
+
+        if message and message.photo:
+            # The largest size is the one that was uploaded
+            self.photo_ids.put(key, message.photo[-1].file_id)
+
+    def send_orders(self, bot, chat_id, board, orders, resolutions, caption):
+        profile = self.image_profiles.get(chat_id, default_profile)
+
+        try:
+            bot.send_chat_action(chat_id, ChatAction.UPLOAD_PHOTO)
 
-        with open(board_png, "b") as fd:
-            bot.send_photo(
-                game.chat_id, fd, "State of the board ({})".format(game.date()))
+            data = self.wait_for_image(
+                bot, chat_id, self.renderer.submit_orders(
+                    board, orders, resolutions, profile))
 
-        os.unlink(board_png)
+            bot.send_photo(chat_id, io.BytesIO(data), caption)
+
+        except Exception as e:
+            self.log_error(e, "sending the orders")
+
+    def wait_for_image(self, bot, chat_id, future, *others):
+        # Chat actions only last a few seconds, keep them coming until
+        # the image (or the first of the others) is ready
+        futures = [future, *others]
+
+        while not wait(futures, self.chat_action_interval,
+                       FIRST_COMPLETED).done:
+            bot.send_chat_action(chat_id, ChatAction.UPLOAD_PHOTO)
+
+        if future.done():
+            return future.result()
+
+        return None
 
     def print_board_old(self, bot, game):
         message = "DEBUG: state of the board\n\n"
@@ -110,6 +249,34 @@ class Diplobot:
     def help_cmd(self, bot, update):
         update.message.reply_text("There's no help right now", quote=False)
 
+    @group_chat
+    def image_cmd(self, bot, update):
+        chat_id = update.message.chat.id
+        profile = update.message.text.partition(" ")[2].strip().lower()
+
+        if not profile:
+            current = self.image_profiles.get(chat_id, default_profile)
+
+            update.message.reply_text(
+                "Boards in this chat are sent as {}\n"
+                "Choose another format with /image followed by one of: {}"
+                .format(current, ", ".join(sorted(profiles))),
+                quote=False)
+
+            return
+
+        if profile not in profiles:
+            update.message.reply_text(
+                "Unknown format, choose one of: "
+                + ", ".join(sorted(profiles)),
+                quote=False)
+
+            return
+
+        self.image_profiles[chat_id] = profile
+        update.message.reply_text(
+            "Boards will be sent as " + profile, quote=False)
+
     @group_chat
     @no_game_in_chat
     def newgame_cmd(self, bot, update):
@@ -234,14 +401,21 @@ class Diplobot:
         game.assigning_message = message
 
     def nations_menu_cbh(self, bot, update):
-        error = False
-
         try:
             game = self.games[update.callback_query.message.chat.id]
         except KeyError:
-            error = True
+            game = None
+
+        if game is None:
+            update.callback_query.answer("This control is no longer active")
+            update.callback_query.message.edit_reply_markup()
+            return
 
-        if error or game.state != "CHOOSING_NATIONS":
+        with game.lock:
+            self.nations_menu_choice(bot, update, game)
+
+    def nations_menu_choice(self, bot, update, game):
+        if game.state != "CHOOSING_NATIONS":
             update.callback_query.answer("This control is no longer active")
             update.callback_query.message.edit_reply_markup()
             return
@@ -335,14 +509,13 @@ class Diplobot:
         self.turn_start(bot, game)
 
     def turn_start(self, bot, game):
-        self.print_board(bot, game)
-
         game.state = "ORDER_PHASE"
 
-        bot.send_message(
+        self.print_board(bot, game, partial(
+            bot.send_message,
             game.chat_id,
             "<b>Awaiting orders for {}</b>".format(game.date()),
-            parse_mode=ParseMode.HTML)
+            parse_mode=ParseMode.HTML))
 
         for p in game.players.values():
             p.reset()
@@ -362,6 +535,7 @@ class Diplobot:
 
         message += ("/new - submit a new order\n"
                     "/delete - withdraw an order\n"
+                    "/preview - see how your orders would fare\n"
                     "/ready - when you are done")
 
         bot.send_message(player.id, message, reply_markup=RKRemove())
@@ -511,6 +685,70 @@ class Diplobot:
         player.ready = False
         self.show_command_menu(bot, game, player)
 
+    @private_chat
+    @player_in_game
+    @game_state("ORDER_PHASE")
+    def preview_cmd(self, bot, update, game, player):
+        text = update.message.text.partition(" ")[2]
+
+        try:
+            scenario = [parse_order(s)
+                        for s in re.split(r"[,;\n]", text) if s.strip()]
+
+        except ValueError as e:
+            update.message.reply_text("Invalid order: {}".format(e))
+            return
+
+        for o in scenario:
+            if not game.board[o.terr].occupied:
+                update.message.reply_text("There is no unit in " + o.terr)
+                return
+
+        # Orders given in the scenario replace the player's own, every
+        # other unit holds
+        replaced = {o.terr for o in scenario}
+        orders = scenario + [o for o in sorted(player.orders)
+                             if o.terr not in replaced]
+
+        if not orders:
+            update.message.reply_text(
+                "There is nothing to preview. Submit some orders with /new, "
+                "or describe a scenario, e.g. /preview Par-Bur, Mar S Par-Bur")
+            return
+
+        # The compact snapshot is taken now, so the turn can go on in the
+        # meantime
+        future = self.adjudicators.submit(
+            adjudicate, game.board.compact(), orders, self.preview_backend)
+
+        future.add_done_callback(
+            lambda f: self.continuations.submit(
+                self.preview_done, bot, player, orders, f))
+
+    def preview_done(self, bot, player, orders, future):
+        try:
+            resolutions, retreats = future.result()
+
+        except Exception as e:
+            self.log_error(e, "previewing orders")
+            bot.send_message(player.id, "Couldn't preview these orders")
+            return
+
+        message = "<b>PREVIEW</b> (units without orders hold)\n\n"
+
+        for o, r in sorted(zip(orders, resolutions), key=itemgetter(0)):
+            res_mark = ("\N{OK HAND SIGN}"
+                        if r
+                        else "\N{OPEN HANDS SIGN}")
+
+            message += "{} {}\n".format(str(o), res_mark)
+
+        if retreats:
+            message += ("\n<b>These units would be dislodged:</b>\n"
+                        + ", ".join(sorted(retreats.keys(), key=str.casefold)))
+
+        bot.send_message(player.id, message, parse_mode=ParseMode.HTML)
+
     def ready_check(self, bot, game):
         if all(p.ready for p in game.players.values()):
             if game.state == "ORDER_PHASE":
@@ -519,18 +757,59 @@ class Diplobot:
     def run_adjudication(self, bot, game):
         game.state = "ADJUDICATING"
 
+        players = sorted(game.players.values(), key=attrgetter("nation"))
+        orders = list(chain(*(sorted(p.orders) for p in players)))
+
+        future = self.adjudicators.submit(
+            adjudicate, game.board.compact(), orders)
+
+        # The callback runs on an adjudication thread, so hand the rest
+        # of the turn over to a thread that is free to block on the network
+        future.add_done_callback(
+            lambda f: self.continuations.submit(
+                self.adjudication_done, bot, game, orders, f))
+
+    def adjudication_done(self, bot, game, orders, future):
+        with game.lock:
+            if self.games.get(game.chat_id) is not game:
+                return
+
+            try:
+                resolutions, retreats = future.result()
+
+            except Exception as e:
+                self.log_error(e, "adjudicating")
+                self.adjudication_failed(bot, game)
+                return
+
+            try:
+                self.finish_adjudication(bot, game, orders, resolutions, retreats)
+
+            except Exception as e:
+                self.log_error(e, "finishing adjudication")
+
+    def adjudication_failed(self, bot, game):
+        game.state = "ORDER_PHASE"
+
+        for p in game.players.values():
+            p.ready = False
+
+        bot.send_message(
+            game.chat_id,
+            "Something went wrong while adjudicating this turn. "
+            "Please send /ready again")
+
+    def finish_adjudication(self, bot, game, orders, resolutions, retreats):
         data = [
             (p.nation, p.get_handle(bot, game.chat_id), sorted(p.orders))
             for p in sorted(game.players.values(), key=attrgetter("nation"))
         ]
 
-        orders = list(chain(*(os for n, h, os in data)))
-        resolutions, retreats = adjudicate(game.board, orders)
-
         for p in game.players.values():
             dislodged = {t for t in retreats if game.board[t].occupied == p.nation}
 
-            p.retreats = {t: retreats[t] for t in dislodged if retreats[t]}
+            p.retreats = {t: self.retreat_options(game.board, t, retreats[t])
+                          for t in dislodged if retreats[t]}
             p.destroyed = {t for t in dislodged if not retreats[t]}
 
             p.retreat_choices = [
@@ -542,11 +821,14 @@ class Diplobot:
             p.ready = False
 
         successful_moves = {
-            (o.terr, o.targ)
+            (o.terr, o.targ, self.move_coast(game.board, o))
             for o, r in zip(orders, resolutions)
             if r and o.kind == "MOVE"
         }
 
+        # The orders are drawn on the board they were given on
+        board = game.board.compact()
+
         self.apply_moves(game.board, successful_moves)
 
         res_it = iter(resolutions)
@@ -581,24 +863,52 @@ class Diplobot:
 
         bot.send_message(game.chat_id, message, parse_mode=ParseMode.HTML)
 
+        if order_arrows and not no_orders:
+            self.continuations.submit(
+                self.send_orders, bot, game.chat_id, board, orders,
+                resolutions, "Orders ({})".format(game.date()))
+
         game.state = "RETREAT_PHASE"
 
         for p in game.players.values():
             self.show_retreats_menu(bot, game, p)
 
+    def move_coast(self, board, o):
+        if board[o.terr].kind != "F" or o.targ not in split_coasts:
+            return None
+
+        return o.coast or board.infer_coast(o.terr, o.targ)
+
+    def retreat_options(self, board, t, options):
+        # A fleet retreats to one of the coasts of a split territory, and
+        # only to those it could move to
+        if board[t].kind != "F":
+            return set(options)
+
+        node = t + board[t].coast if t in split_coasts else t
+        neighs = sea_graph.neighbors(node)
+
+        ret = set()
+
+        for t2 in options:
+            if t2 in split_coasts:
+                ret.update(c for c in neighs if strip_coast(c) == t2)
+            else:
+                ret.add(t2)
+
+        return ret
+
     def apply_moves(self, board, moves):
         nations = []
         kinds = []
 
-        for t1, t2 in moves:
+        for t1, t2, c in moves:
             nations.append(board[t1].occupied)
             kinds.append(board[t1].kind)
-            board[t1].occupied = None
-            board[t1].kind = None
+            board.remove_unit(t1)
 
-        for (t1, t2), n, k in zip(moves, nations, kinds):
-            board[t2].occupied = n
-            board[t2].kind = k
+        for (t1, t2, c), n, k in zip(moves, nations, kinds):
+            board.place_unit(t2, n, k, c)
 
     def show_retreats_menu(self, bot, game, player):
         if not player.retreat_choices and not player.destroyed:
@@ -696,13 +1006,23 @@ class Diplobot:
             self.show_retreats_prompt(bot, game, player)
             return
 
+        m = re.match(r"^(\w{3})\s*(\((?:NC|SC)\))?$", s)
+
         try:
-            t2 = terr_names.match_case(s)
-        except KeyError:
+            t2 = terr_names.match_case(m.group(1)) + (m.group(2) or "")
+        except (AttributeError, KeyError):
             update.message.reply_text("Invalid input")
             return
 
-        if t2 not in player.retreats[t1]:
+        options = player.retreats[t1]
+
+        # No need to name the coast when there's only one to go to
+        coasts = [c for c in options if strip_coast(c) == t2]
+
+        if t2 not in options and len(coasts) == 1:
+            t2, = coasts
+
+        if t2 not in options:
             update.message.reply_text("Can't retreat in " + t2)
             return
 
@@ -724,29 +1044,36 @@ class Diplobot:
         seen = set()
         dupes = set()
 
+        # Fleets retreat to a coast, but the two coasts of a territory
+        # are still the same place
+        def clash(r):
+            return bool(r[2]) and strip_coast(r[2]) in dupes
+
         for t1, k, t2 in retreats:
             if not t2:
                 continue
 
-            if t2 in seen:
-                dupes.add(t2)
+            if strip_coast(t2) in seen:
+                dupes.add(strip_coast(t2))
                 continue
 
-            seen.add(t2)
+            seen.add(strip_coast(t2))
 
         for p in game.players.values():
-            for t1, k, t2 in p.retreat_choices:
-                if t2 and t2 not in dupes:
-                    game.board[t2].occupied = p.nation
-                    game.board[t2].kind = k
+            for r in p.retreat_choices:
+                t1, k, t2 = r
+
+                if t2 and not clash(r):
+                    game.board.place_unit(
+                        strip_coast(t2), p.nation, k, get_coast(t2) or None)
 
         bad_retreats = sorted(
-            filter(lambda r: r[2] in dupes, retreats),
+            filter(clash, retreats),
             key=lambda r: (r[2].casefold(), r[0].casefold()))
 
         good_retreats = sorted(
-            filter(lambda r: r[2] not in dupes, retreats),
-            key=lambda r: (r[0].casefold(), r[2].casefold()))
+            filter(lambda r: not clash(r), retreats),
+            key=lambda r: (r[0].casefold(), (r[2] or "").casefold()))
 
         message = ""
 
@@ -809,8 +1136,8 @@ class Diplobot:
         return True
 
     def distance_from_home(self, t, nation):
-        distances = full_graph.distances(t)
-        return min(distances[hsc] for hsc in home_centers[nation])
+        return min(full_distances.distance(t, hsc)
+                   for hsc in home_centers[nation])
 
     def auto_disband(self, board, nation, n):
         candidates = sorted(
@@ -827,9 +1154,7 @@ class Diplobot:
         disbanding = map(itemgetter(3), candidates[:n])
 
         for t in disbanding:
-            board[t].occupied = None
-            board[t].kind = None
-            board[t].coast = None
+            board.remove_unit(t)
 
     def update_centers(self, bot, game):
         game.state = "BUILDING_PHASE"
@@ -838,7 +1163,7 @@ class Diplobot:
 
         for t in supp_centers:
             if game.board[t].occupied:
-                game.board[t].owner = game.board[t].occupied
+                game.board.set_owner(t, game.board[t].occupied)
 
         if self.check_victory(bot, game):
             return
@@ -856,9 +1181,7 @@ class Diplobot:
 
             if p and not centers:
                 for t in units:
-                    game.board[t].occupied = None
-                    game.board[t].kind = None
-                    game.board[t].coast = None
+                    game.board.remove_unit(t)
 
                 bot.send_message(p.id, "You lost!")
                 bot.send_message(
@@ -1143,15 +1466,11 @@ class Diplobot:
         for p in game.players.values():
             if p.units_disbanding:
                 for t in p.units_choices:
-                    game.board[t].occupied = None
-                    game.board[t].kind = None
-                    game.board[t].coast = None
+                    game.board.remove_unit(t)
 
             else:
                 for t, k, c in p.units_choices:
-                    game.board[t].occupied = p.nation
-                    game.board[t].kind = k
-                    game.board[t].coast = c
+                    game.board.place_unit(t, p.nation, k, c)
 
         game.advance()
         self.turn_start(bot, game)
@@ -1162,8 +1481,9 @@ class Diplobot:
         except KeyError:
             return
 
-        if game.state == "CHOOSING_YEAR":
-            self.year_msg_handler(bot, update, game)
+        with game.lock:
+            if game.state == "CHOOSING_YEAR":
+                self.year_msg_handler(bot, update, game)
 
     def general_private_msg_handler(self, bot, update):
         player_id = update.message.chat.id
@@ -1173,9 +1493,15 @@ class Diplobot:
         except KeyError:
             return
 
-        player = game.players[player_id]
+        with game.lock:
+            try:
+                player = game.players[player_id]
+            except KeyError:
+                return
+
+            if player.ready:
+                return
 
-        if not player.ready:
             if game.state == "ORDER_PHASE":
                 if player.builder:
                     self.order_msg_handler(bot, update, game, player)
@@ -1259,6 +1585,8 @@ def main():
     updater.start_polling()
     updater.idle()
 
+    bot.shutdown()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+
+  ############################################################################
+  # Diplobot - play Diplomacy through Telegram                               #
+  # Copyright (C) 2018 Simone Cimarelli a.k.a. AquilaIrreale                 #
+  #                                                                          #
+  # This program is free software: you can redistribute it and/or modify     #
+  # it under the terms of the GNU Affero General Public License as published #
+  # by the Free Software Foundation, either version 3 of the License, or     #
+  # (at your option) any later version.                                      #
+  #                                                                          #
+  # This program is distributed in the hope that it will be useful,          #
+  # but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+  # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+  # GNU Affero General Public License for more details.                      #
+  #                                                                          #
+  # You should have received a copy of the GNU Affero General Public License #
+  # along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+  ############################################################################
+
+
+# Differential fuzzer for the adjudication backends.
+#
+# Generates random legal positions and order sets, the same way the order
+# builder offers them to the players, adjudicates them with every backend
+# and reports the disagreements, shrunk to a minimal case in the format
+# used by datc.py.
+#
+# A backend name followed by ":whole" is adjudicated without splitting
+# the orders in independent groups, so "native native:whole" checks the
+# splitting itself.
+#
+# Run from the repository root: ./fuzz.py [--backend NAME]... [--cases N]
+
+import os
+import sys
+import time
+import random
+import argparse
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import adjudicator
+
+from board import (Board,
+                   coast,
+                   get_coast,
+                   nations,
+                   offshore,
+                   sea_graph,
+                   split_coasts,
+                   strip_coast,
+                   territories)
+from datc import cases, load_case, probe, setup_board
+from order import Order, parse_order
+
+
+batch_size = 500
+
+split_coast_names = {
+    t: sorted(get_coast(c) for c in sea_graph.vertices() if strip_coast(c) == t)
+    for t in split_coasts
+}
+
+
+def random_board(rng, max_units=34):
+    board = Board()
+
+    board.empty()
+
+    for t in rng.sample(sorted(territories), rng.randint(2, max_units)):
+        nation = rng.choice(nations)
+
+        if t in offshore:
+            kind = "F"
+        elif t in coast:
+            kind = rng.choice("AF")
+        else:
+            kind = "A"
+
+        if kind == "F" and t in split_coasts:
+            c = rng.choice(split_coast_names[t])
+        else:
+            c = None
+
+        board.place_unit(t, nation, kind, c)
+
+    return board
+
+
+def random_move(rng, board, t):
+    dests = board.valid_dests(t)
+    dests_via_c = board.valid_dests_via_c(t)
+
+    if not dests | dests_via_c:
+        return None
+
+    o = Order()
+    o.kind = "MOVE"
+    o.terr = t
+    o.targ = rng.choice(sorted(dests | dests_via_c))
+
+    if o.targ not in dests:
+        o.via_c = True
+    elif o.targ in dests_via_c:
+        o.via_c = rng.random() < 0.5
+
+    if board.needs_coast(t, o.targ):
+        o.coast = (board.infer_coast(t, o.targ)
+                   or rng.choice(split_coast_names[o.targ]))
+
+    return o
+
+
+def random_support(rng, board, t, moves):
+    reach = board.valid_dests(t)
+
+    o = Order()
+    o.terr = t
+
+    # Mostly support moves that are actually ordered, so that the
+    # supports have something to do
+    candidates = [m for m in moves.values()
+                  if m.terr != t and strip_coast(m.targ) in reach]
+
+    if candidates and rng.random() < 0.8:
+        m = rng.choice(candidates)
+
+        o.kind = "SUPM"
+        o.orig = m.terr
+        o.targ = m.targ
+
+        return o
+
+    held = sorted(t2 for t2 in reach if board[t2].occupied)
+
+    if not held:
+        return None
+
+    o.kind = "SUPH"
+    o.targ = rng.choice(held)
+
+    return o
+
+
+def random_convoy(rng, board, t, moves):
+    if t not in offshore:
+        return None
+
+    armies = {t2 for t2 in map(strip_coast, sea_graph.neighbors(
+                  board.contiguous_fleets({t})))
+              if board[t2].occupied and board[t2].kind == "A"}
+
+    candidates = [m for m in moves.values() if m.via_c and m.terr in armies]
+
+    o = Order()
+    o.kind = "CONV"
+    o.terr = t
+
+    if candidates and rng.random() < 0.8:
+        m = rng.choice(candidates)
+        o.orig = m.terr
+        o.targ = m.targ
+
+        return o
+
+    armies = sorted(a for a in armies if board.valid_dests_via_c(a))
+
+    if not armies:
+        return None
+
+    o.orig = rng.choice(armies)
+    o.targ = rng.choice(sorted(board.valid_dests_via_c(o.orig)))
+
+    return o
+
+
+def random_orders(rng, board):
+    units = sorted(board.occupied())
+    kinds = {t: rng.choice(("HOLD", "MOVE", "MOVE", "SUP", "SUP", "CONV"))
+             for t in units}
+
+    moves = {}
+
+    for t in units:
+        if kinds[t] == "MOVE":
+            o = random_move(rng, board, t)
+
+            if o is not None:
+                moves[t] = o
+
+    orders = list(moves.values())
+
+    for t in units:
+        if t in moves:
+            continue
+
+        o = None
+
+        if kinds[t] == "SUP":
+            o = random_support(rng, board, t, moves)
+        elif kinds[t] == "CONV":
+            o = random_convoy(rng, board, t, moves)
+
+        if o is None:
+            o = Order()
+            o.kind = "HOLD"
+            o.terr = t
+
+        orders.append(o)
+
+    rng.shuffle(orders)
+
+    return orders
+
+
+def run_backend(spec, board, orders):
+    backend, _, mode = spec.partition(":")
+
+    try:
+        resolutions, retreats = adjudicator.adjudicate(
+            board, orders, backend, use_cache=False, split=mode != "whole")
+
+    except Exception as e:
+        return "{}: {}".format(type(e).__name__, e)
+
+    return ([bool(r) for r in resolutions],
+            {t: sorted(ts) for t, ts in retreats.items()})
+
+
+def disagree(backends, board, orders):
+    results = [run_backend(b, board, orders) for b in backends]
+    return any(r != results[0] for r in results[1:])
+
+
+def describe_units(board):
+    ret = []
+
+    for t in sorted(board.occupied()):
+        ret.append("{} {} {}{}".format(
+            board[t].occupied, board[t].kind, t, board[t].coast or ""))
+
+    return ret
+
+
+def shrink(backends, units, orders):
+    # Greedily drop units (with their orders), then turn orders into holds,
+    # for as long as the backends keep disagreeing
+    def check(units, orders):
+        return disagree(backends, setup_board(units), list(map(parse_order, orders)))
+
+    changed = True
+
+    while changed:
+        changed = False
+
+        for u in list(units):
+            t = u.split()[2][:3]
+            units2 = [u2 for u2 in units if u2 != u]
+            orders2 = [o for o in orders if o[:3] != t]
+
+            if units2 and check(units2, orders2):
+                units, orders = units2, orders2
+                changed = True
+
+        for i, o in enumerate(orders):
+            hold = o[:3] + " H"
+
+            if o == hold:
+                continue
+
+            orders2 = orders[:i] + [hold] + orders[i+1:]
+
+            if check(units, orders2):
+                orders = orders2
+                changed = True
+
+    return units, orders
+
+
+def fuzz_batch(backends, seed, count, max_reports):
+    rng = random.Random(seed)
+    found = []
+
+    for n in range(count):
+        if len(found) >= max_reports:
+            # Shrinking is slow, and nobody would see the rest anyway
+            return n, found
+
+        board = random_board(rng)
+        orders = random_orders(rng, board)
+
+        if disagree(backends, board, orders):
+            units, orders = shrink(
+                backends, describe_units(board), list(map(str, orders)))
+
+            board = setup_board(units)
+            results = {b: run_backend(b, board, list(map(parse_order, orders)))
+                       for b in backends}
+
+            found.append((seed, n, units, orders, results))
+
+    return count, found
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Differential fuzzer for the adjudication backends")
+    parser.add_argument("--backend", action="append",
+                        help="backend to compare (default: all of them)")
+    parser.add_argument("--cases", type=int, default=1000000,
+                        help="number of random positions to try")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="seed of the first batch (default: random)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes")
+    parser.add_argument("--max-reports", type=int, default=10,
+                        help="stop after this many disagreements")
+    args = parser.parse_args()
+
+    backends = args.backend or sorted(adjudicator.backends)
+    loaded = [load_case(cases[0])]
+
+    for b in list(backends):
+        error = probe(loaded, b.partition(":")[0])
+
+        if error is None:
+            continue
+
+        if args.backend:
+            parser.error("backend {} is unavailable ({})".format(
+                b, error.splitlines()[0]))
+
+        # Like datc.py, leave out the default backends that can't run here,
+        # or every position would be reported as a disagreement
+        print("{} unavailable, skipped ({})".format(b, error.splitlines()[0]))
+        backends.remove(b)
+
+    if len(backends) < 2:
+        parser.error("at least two backends are needed")
+
+    seed = args.seed if args.seed is not None else random.randrange(2**32)
+    batches = (args.cases + batch_size - 1) // batch_size
+
+    print("Comparing {} on {} positions, seed {}".format(
+        ", ".join(backends), batches * batch_size, seed))
+
+    done = 0
+    reports = 0
+    start = time.perf_counter()
+
+    with ProcessPoolExecutor(args.workers) as executor:
+        futures = [executor.submit(fuzz_batch, backends, seed + i, batch_size,
+                                   args.max_reports)
+                   for i in range(batches)]
+
+        for f in as_completed(futures):
+            count, found = f.result()
+            done += count
+
+            for batch_seed, n, units, orders, results in found:
+                if reports >= args.max_reports:
+                    break
+
+                reports += 1
+
+                print()
+                print("Disagreement (seed {}, case {}):".format(batch_seed, n))
+                print("    {},".format(units))
+                print("    {},".format(orders))
+
+                for b, r in results.items():
+                    print("    {}: {}".format(b, r))
+
+            if reports >= args.max_reports:
+                executor.shutdown(wait=False, cancel_futures=True)
+                break
+
+            if done % (batch_size * 100) == 0:
+                elapsed = time.perf_counter() - start
+                print("{} positions, {:.0f}/s".format(done, done / elapsed))
+
+    elapsed = time.perf_counter() - start
+
+    print()
+    print("{} positions in {:.1f}s ({:.0f}/s), {} disagreements".format(
+        done, elapsed, done / elapsed, reports))
+
+    if reports:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
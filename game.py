@@ -18,6 +18,8 @@
   ############################################################################
 
 
+import threading
+
 from operator import attrgetter
 
 from board import Board
@@ -73,6 +75,10 @@ class Game:
         self.assigning_message = None
         self.year = 1900
         self.autumn = False
+        self.lock = threading.RLock()
+
+        # Snapshot of the board as last shown in the chat
+        self.shown_board = None
 
     def add_player(self, player_id, bot=None):
         player = Player(player_id, self.board)
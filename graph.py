@@ -19,7 +19,8 @@
 
 
 import math
-import heapq
+
+from array import array
 
 
 class Graph:
@@ -85,35 +86,28 @@ class Graph:
         return ret
 
     def distances(self, v):
-        distances = {v: math.inf for v in self.vertices()}
+        distances = {u: math.inf for u in self.vertices()}
         distances[v] = 0
-        queue = [(0, v)]
-
-        while queue:
-            curdist, cur = heapq.heappop(queue)
-
-            changed = set()
-
-            for n in self.neighbors((cur,)):
-                if curdist + 1 < distances[n]:
-                    distances[n] = curdist + 1
-                    changed.add(n)
-
-            for i, (p, v) in enumerate(queue):
-                if v in changed:
-                    queue[i] = (curdist + 1, v)
-                    changed.discard(v)
+        frontier = [v]
 
-                    if not changed:
-                        break
+        # Every edge has the same length: a breadth first visit reaches
+        # each vertex along a shortest path
+        while frontier:
+            next_frontier = []
 
-            for v in changed:
-                queue.append((curdist + 1, v))
+            for cur in frontier:
+                for n in self._graph_dict[cur]:
+                    if distances[n] == math.inf:
+                        distances[n] = distances[cur] + 1
+                        next_frontier.append(n)
 
-            heapq.heapify(queue)
+            frontier = next_frontier
 
         return distances
 
+    def distance_table(self):
+        return DistanceTable(self)
+
     def components(self):
         vertices = self.vertices()
 
@@ -133,3 +127,53 @@ class Graph:
             ", ".join(sorted(self._graph_dict.keys())),
             ", ".join(sorted("({}, {})".format(*sorted(e)) for e in self.edges()))
         )
+
+
+class DistanceTable:
+    """Distances between every pair of vertices of a graph, in a flat
+    array indexed by the ids of the two vertices"""
+
+    unreachable = 0xFFFF
+
+    def __init__(self, graph):
+        self.vertices = sorted(graph.vertices())
+        self.ids = {v: i for i, v in enumerate(self.vertices)}
+
+        n = len(self.vertices)
+        self.table = array("H", [self.unreachable]) * (n * n)
+
+        neighbors = [
+            [self.ids[u] for u in graph.dict[v] if u in self.ids]
+            for v in self.vertices
+        ]
+
+        for source in range(n):
+            row = source * n
+            self.table[row + source] = 0
+            frontier = [source]
+            d = 0
+
+            while frontier:
+                d += 1
+                next_frontier = []
+
+                for cur in frontier:
+                    for u in neighbors[cur]:
+                        if self.table[row + u] == self.unreachable:
+                            self.table[row + u] = d
+                            next_frontier.append(u)
+
+                frontier = next_frontier
+
+    def distance(self, v1, v2):
+        d = self.table[self.ids[v1] * len(self.vertices) + self.ids[v2]]
+        return math.inf if d == self.unreachable else d
+
+    def distances(self, v):
+        n = len(self.vertices)
+        row = self.ids[v] * n
+
+        return {
+            u: math.inf if d == self.unreachable else d
+            for u, d in zip(self.vertices, self.table[row:row + n])
+        }
@@ -18,20 +18,36 @@
   ############################################################################
 
 
+import io
 import re
 import os
-import tempfile
+import sys
+import json
+import time
+import struct
+import threading
+import multiprocessing
 import subprocess
 import xml.etree.ElementTree as ET
 
-from copy import deepcopy
+from copy import copy, deepcopy
+from functools import partial
+from concurrent.futures import Future, ProcessPoolExecutor
+from html import escape
+from importlib.util import find_spec
 
-from board import supp_centers, split_coasts
+import bundle
 
+from board import Board, full_graph, supp_centers, split_coasts
+from cache import LRUCache, TieredCache, digest, user_cache_dir
+
+# cairosvg and Pillow are only imported once something is drawn, which
+# keeps importing this module quick. Whether they are there is known now
+have_cairosvg = find_spec("cairosvg") is not None
+have_pillow = find_spec("PIL") is not None
 
-def set_style(e, key, value):
-    style = e.get("style", default="")
 
+def styled(style, key, value):
     if re.match(r"\b{}:".format(key), style):
         style = re.sub(r"\b{}:[^;]*".format(key), "{}:{}".format(key, value), style)
 
@@ -41,22 +57,71 @@ def set_style(e, key, value):
 
         style += "{}:{}".format(key, value)
 
-    e.set("style", style)
+    return style
+
 
+def unstyled(style, key):
+    return re.sub(r"\b{}:[^;]*;?".format(key), "", style)
 
-def del_style(e, key):
-    style = e.get("style", default="")
-    style = re.sub(r"\b{}:[^;]*;?".format(key), "", style)
-    e.set("style", style)
+
+def set_style(e, key, value):
+    e.set("style", styled(e.get("style", default=""), key, value))
 
 
-board_svg = ET.parse("assets/board.svg")
+ET.register_namespace("", "http://www.w3.org/2000/svg")
+ET.register_namespace("xlink", "http://www.w3.org/1999/xlink")
 
 piece_re = re.compile(r"^\w{3}_[AF](_(NC|SC))?$")
 
-for e in board_svg.getroot().iter():
-    if piece_re.match(e.get("id", default="")):
-        set_style(e, "display", "none")
+
+# Position (as a path of child indices) of every dot and piece in the
+# tree, valid for any copy of it
+
+def index_elements(e, path=(), index=None):
+    if index is None:
+        index = {}
+
+    for i, child in enumerate(e):
+        child_path = path + (i,)
+        child_id = child.get("id", default="")
+
+        if child_id.endswith("_dot") or piece_re.match(child_id):
+            index[child_id] = child_path
+
+        index_elements(child, child_path, index)
+
+    return index
+
+
+# The SVG and everything made from it come from the asset bundle, and
+# are only loaded when a board is first drawn
+
+@bundle.part("board-svg", "assets/board.svg")
+def load_board_svg():
+    root = ET.parse("assets/board.svg").getroot()
+
+    for e in root.iter():
+        if piece_re.match(e.get("id", default="")):
+            set_style(e, "display", "none")
+
+    return root, index_elements(root)
+
+
+def board_svg():
+    return bundle.get("board-svg")[0]
+
+
+def element_paths():
+    return bundle.get("board-svg")[1]
+
+
+def find_element(root, element_id):
+    e = root
+
+    for i in element_paths()[element_id]:
+        e = e[i]
+
+    return e
 
 
 nation_colors = {
@@ -70,50 +135,1087 @@ nation_colors = {
 }
 
 
-def render_board(board):
-    board_copy = deepcopy(board_svg)
-    root = board_copy.getroot()
+png_width = 1280
+png_height = 1175
+
+
+# The SVG is serialized once, with a marker in place of the style of
+# every dot and piece (and of the shape filled with the piece's color).
+# Rendering a board joins the static parts of the template with the
+# precomputed style of each of those elements
+
+slot_re = re.compile(rb"\{slot:([^}]*)\}")
+
+
+def attr_fragment(value):
+    return escape(value).encode()
+
+
+@bundle.part("template", "assets/board.svg", salt=nation_colors)
+def build_template():
+    root = deepcopy(board_svg())
+
+    styles = {}
+
+    for element_id in element_paths():
+        e = find_element(root, element_id)
+        styles[element_id] = e.get("style", default="")
+        e.set("style", "{slot:" + element_id + "}")
+
+        if piece_re.match(element_id):
+            styles[element_id + "/fill"] = e[0].get("style", default="")
+            e[0].set("style", "{slot:" + element_id + "/fill}")
+
+    parts = slot_re.split(ET.tostring(root))
+
+    fragments = {}
+
+    for slot, style in styles.items():
+        if slot.endswith("_dot") or slot.endswith("/fill"):
+            variants = {n: attr_fragment(styled(style, "fill", color))
+                        for n, color in nation_colors.items()}
+        else:
+            variants = {True: attr_fragment(unstyled(style, "display"))}
+
+        variants[None] = attr_fragment(style)
+        fragments[slot] = variants
+
+    positions = {}
+
+    for i in range(1, len(parts), 2):
+        slot = parts[i].decode()
+        positions[slot] = i
+        parts[i] = fragments[slot][None]
+
+    # Images rendered from a different template must not be picked up
+    # from the disk cache
+    version = digest(parts)
+
+    return parts, positions, fragments, version
+
+
+def template_version():
+    return bundle.get("template")[3]
+
+
+def piece_id(t, kind, coast=None):
+    ret = "{}_{}".format(t, kind)
+
+    if t in split_coasts and kind == "F":
+        ret += "_NC" if coast == "(NC)" else "_SC"
+
+    return ret
+
+
+def board_states(board):
+    """State of every dot and piece shown on the board, by element id
+
+    Owned dots map to their owner and pieces to the nation occupying
+    the territory; elements that are not listed keep their default look
+    """
+
+    states = {}
 
     for t in board.owned() & supp_centers:
-        e = root.find('.//*[@id="{}_dot"]'.format(t))
-        color = nation_colors[board[t].owner]
-        set_style(e, "fill", color)
+        states[t + "_dot"] = board[t].owner
 
     for t in board.occupied():
-        k = board[t].kind
-        c = board[t].coast
+        states[piece_id(t, board[t].kind, board[t].coast)] = board[t].occupied
+
+    return states
+
+
+def board_to_svg(board):
+    template, slot_positions, slot_fragments = bundle.get("template")[:3]
+    out = list(template)
+
+    def fill(slot, state):
+        out[slot_positions[slot]] = slot_fragments[slot][state]
+
+    for element_id, state in board_states(board).items():
+        if element_id.endswith("_dot"):
+            fill(element_id, state)
+        else:
+            fill(element_id, True)
+            fill(element_id + "/fill", state)
+
+    return b"".join(out)
+
+
+def inkscape_rasterize(svg, size=None):
+    width, height = size or (png_width, png_height)
+
+    # The SVG goes in through stdin and the PNG comes back through a
+    # pipe of its own, as Inkscape prints its messages on stdout
+    png_r, png_w = os.pipe()
+
+    try:
+        proc = subprocess.Popen(
+            [
+                "inkscape",
+                "--file=/dev/stdin",
+                "--export-png=/dev/fd/{}".format(png_w),
+                "--export-width={}".format(width),
+                "--export-height={}".format(height)
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            pass_fds=(png_w,))
+
+    except OSError:
+        os.close(png_r)
+        raise
+
+    finally:
+        os.close(png_w)
+
+    # Drain the pipe while Inkscape runs, or it would fill up and block
+    chunks = []
+    reader = threading.Thread(
+        target=lambda: chunks.extend(iter(partial(os.read, png_r, 65536), b"")))
+
+    try:
+        reader.start()
+        proc.communicate(svg)
+        reader.join()
+
+    finally:
+        os.close(png_r)
+
+    if proc.returncode:
+        raise RuntimeError(
+            "inkscape exited with status {}".format(proc.returncode))
+
+    return b"".join(chunks)
+
+
+def cairosvg_rasterize(svg, size=None):
+    if not have_cairosvg:
+        raise RuntimeError("cairosvg is not installed")
+
+    import cairosvg
+
+    width, height = size or (png_width, png_height)
+
+    return cairosvg.svg2png(
+        bytestring=svg, output_width=width, output_height=height)
+
+
+rasterizers = {
+    "inkscape": inkscape_rasterize,
+    "cairosvg": cairosvg_rasterize
+}
+
+default_rasterizer = "cairosvg" if have_cairosvg else "inkscape"
+
+
+render_cache_size = 64
+render_cache_dir = user_cache_dir("renders")
+render_cache_max_bytes = 256 * 2**20
+
+render_cache = None
+bytes_saved = 0
+
+
+def get_render_cache():
+    global render_cache
+
+    if render_cache is None:
+        render_cache = TieredCache(
+            render_cache_size, render_cache_dir,
+            dumps=bytes, loads=bytes, maxbytes=render_cache_max_bytes)
+
+    return render_cache
+
+
+def board_key(board):
+    return tuple(
+        (t, terr.owner, terr.occupied, terr.kind, terr.coast)
+        for t, terr in sorted(board.items()))
+
+
+def render_cache_stats():
+    ret = get_render_cache().stats()
+    ret["bytes_saved"] = bytes_saved
+
+    return ret
+
+
+# Layered rendering: the map without dots and pieces is rasterized once,
+# and so is every dot and piece in every color it can take. Each board is
+# then drawn by pasting those sprites on a copy of the base image
+
+compositing = have_pillow and have_cairosvg
+
+support_tags = {"metadata", "title", "desc", "defs"}
+
+layers = {}
+layers_failed = set()
+layers_lock = threading.Lock()
+
+
+def local_tag(e):
+    return e.tag.rpartition("}")[2]
+
+
+def element_variant(e, element_id, state):
+    e = copy(e)
+
+    if element_id.endswith("_dot"):
+        if state is not None:
+            set_style(e, "fill", nation_colors[state])
+
+    else:
+        e.set("style", unstyled(e.get("style", default=""), "display"))
+        fill = copy(e[0])
+        set_style(fill, "fill", nation_colors[state])
+        e[0] = fill
+
+    return e
+
+
+def isolated_svg(support, children):
+    root = board_svg()
+
+    out = ET.Element(root.tag, root.attrib)
+    out.extend(support)
+    out.extend(children)
+
+    return ET.tostring(out)
+
+
+def intersects(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def build_layers(rasterizer):
+    paths = element_paths()
+
+    if any(len(path) != 1 for path in paths.values()):
+        raise RuntimeError(
+            "Layered rendering needs every dot and piece at the top level "
+            "of board.svg")
+
+    support = []
+    drawn = []
+
+    for e in board_svg():
+        if local_tag(e) in support_tags:
+            support.append(e)
+        else:
+            drawn.append(e)
+
+    def render(children):
+        return png_to_image(
+            rasterizers[rasterizer](isolated_svg(support, children)))
+
+    # Area covered by every dot and piece. Changing color doesn't change it
+    elements = {}
+    bboxes = {}
+
+    for e in drawn:
+        element_id = e.get("id", default="")
+
+        if element_id not in paths:
+            continue
+
+        state = None if element_id.endswith("_dot") else next(iter(nation_colors))
+        bbox = render([element_variant(e, element_id, state)]).getbbox()
+
+        if bbox is not None:
+            elements[element_id] = e
+            bboxes[element_id] = bbox
+
+    # Everything else goes in the base image, except for the elements
+    # drawn over a dot or piece: those are kept as overlays, in their
+    # place in the drawing order
+    base = []
+    items = []
+    above = []
+    run = []
+
+    def flush():
+        if not above:
+            base.extend(run)
+            return
+
+        image = render(run)
+        bbox = image.getbbox()
+
+        if bbox is None:
+            return
+
+        if any(intersects(bbox, b) for b in above):
+            items.append((None, {None: (bbox[:2], image.crop(bbox))}))
+            above.append(bbox)
+        else:
+            base.extend(run)
+
+    for e in drawn:
+        element_id = e.get("id", default="")
+
+        if element_id in elements:
+            flush()
+            run = []
+            items.append((element_id, {}))
+            above.append(bboxes[element_id])
+
+        elif element_id not in paths:
+            run.append(e)
+
+    flush()
+
+    sprites = dict(items)
+
+    # Elements that don't overlap can be rasterized together
+    for state in [None] + list(nation_colors):
+        batches = []
+
+        for element_id in elements:
+            if state is None and not element_id.endswith("_dot"):
+                continue
+
+            bbox = bboxes[element_id]
+
+            for batch in batches:
+                if not any(intersects(bbox, bboxes[i]) for i in batch):
+                    batch.append(element_id)
+                    break
+            else:
+                batches.append([element_id])
+
+        for batch in batches:
+            image = render([element_variant(elements[i], i, state)
+                            for i in batch])
+
+            for i in batch:
+                bbox = bboxes[i]
+                sprites[i][state] = (bbox[:2], image.crop(bbox))
+
+    return render(base), items
+
+
+def layers_key(rasterizer):
+    return digest(("layers", template_version(), rasterizer,
+                   png_width, png_height))
+
+
+def image_to_png(image):
+    out = io.BytesIO()
+    image.save(out, "PNG")
+
+    return out.getvalue()
+
+
+def png_to_image(png):
+    from PIL import Image
+
+    return Image.open(io.BytesIO(png)).convert("RGBA")
+
+
+# Layers are stored as a JSON table of contents, followed by the PNGs it
+# points into: nothing read back from the disk cache is unpickled
+
+def dump_layers(base, items):
+    pngs = [image_to_png(base)]
+    toc = []
+
+    for element_id, sprites in items:
+        entries = []
+
+        for state, (offset, image) in sprites.items():
+            entries.append([state, list(offset), len(pngs)])
+            pngs.append(image_to_png(image))
+
+        toc.append([element_id, entries])
+
+    header = json.dumps({
+        "sizes": [len(png) for png in pngs],
+        "items": toc
+    }).encode()
+
+    return b"".join([struct.pack(">I", len(header)), header] + pngs)
+
+
+def load_layers(data):
+    size, = struct.unpack_from(">I", data)
+    header = json.loads(data[4:4 + size].decode())
+
+    pngs = []
+    start = 4 + size
+
+    for n in header["sizes"]:
+        pngs.append(data[start:start + n])
+        start += n
+
+    if start != len(data):
+        raise ValueError("Malformed layers")
+
+    return png_to_image(pngs[0]), [
+        (element_id, {state: (tuple(offset), png_to_image(pngs[i]))
+                      for state, offset, i in entries})
+        for element_id, entries in header["items"]]
+
+
+def load_or_build_layers(rasterizer):
+    disk = get_render_cache().disk
+    key = layers_key(rasterizer)
+    data = disk.get(key)
+
+    ret = None
+
+    if data is not None:
+        try:
+            ret = load_layers(data)
+        except Exception:
+            ret = None
+
+    if ret is None:
+        ret = build_layers(rasterizer)
+
+        try:
+            disk.put(key, dump_layers(*ret))
+        except OSError:
+            # They are still good for this process
+            pass
+
+    return ret
+
+
+def get_layers(rasterizer=None):
+    rasterizer = rasterizer or default_rasterizer
+
+    with layers_lock:
+        if rasterizer in layers:
+            return layers[rasterizer]
+
+        if rasterizer in layers_failed:
+            raise RuntimeError(
+                "Could not build the layers for {}".format(rasterizer))
+
+        try:
+            ret = load_or_build_layers(rasterizer)
+        except Exception:
+            # Don't try again for every board
+            layers_failed.add(rasterizer)
+            raise
+
+        layers[rasterizer] = ret
+
+        return ret
+
+
+# The last few frames composited by this process. A board shown after
+# one of them only needs the areas of the dots and pieces that changed
+# to be drawn again
+
+frames_size = 8
+frames = LRUCache(frames_size)
+
 
-        piece_id = "{}_{}".format(t, k)
+def frame_key(board, rasterizer):
+    return digest((rasterizer or default_rasterizer, board_key(board)))
 
-        if t in split_coasts and k == "F":
-            piece_id += "_NC" if c == "(NC)" else "_SC"
 
-        e = root.find('.//*[@id="{}"]/*'.format(piece_id))
-        color = nation_colors[board[t].occupied]
-        set_style(e, "fill", color)
+def previous_frame(board, rasterizer):
+    frame = frames.get(frame_key(board, rasterizer))
 
-        e = root.find('.//*[@id="{}"]'.format(piece_id))
-        del_style(e, "display")
+    if frame is not None:
+        return frame
 
-    svg_fd, svg_fn = tempfile.mkstemp()
-    svg = os.fdopen(svg_fd, "wb")
-    board_copy.write(svg)
-    svg.close()
+    # Another process may have drawn it: get it from the render cache
+    png = get_render_cache().get(render_key(board, rasterizer, True, "png"))
 
-    png_fd, png_fn = tempfile.mkstemp()
-    os.close(png_fd)
+    if png is None:
+        return None
 
-    subprocess.run(
-        [
-            "inkscape",
-            "--export-png=" + png_fn,
-            "--export-width=1280",
-            "--export-height=1175",
-            svg_fn
-        ],
-        stdout=subprocess.DEVNULL,
-        stderr=subprocess.DEVNULL)
+    return board_states(board), png_to_image(png)
 
-    os.unlink(svg_fn)
 
-    return png_fn
+def sprite_box(sprite):
+    (x, y), image = sprite
+    return x, y, x + image.width, y + image.height
+
+
+def redraw(frame, box, base, items, states):
+    frame.paste(base.crop(box), box[:2])
+
+    for element_id, sprites in items:
+        sprite = sprites.get(states.get(element_id))
+
+        if sprite is None:
+            continue
+
+        (x, y), image = sprite
+        x0, y0, x1, y1 = sprite_box(sprite)
+
+        if not intersects(box, (x0, y0, x1, y1)):
+            continue
+
+        clip = (max(x0, box[0]), max(y0, box[1]),
+                min(x1, box[2]), min(y1, box[3]))
+
+        frame.alpha_composite(
+            image, dest=clip[:2],
+            source=(clip[0] - x, clip[1] - y, clip[2] - x, clip[3] - y))
+
+
+def composite_board(board, rasterizer=None, previous=None):
+    if not have_pillow:
+        raise RuntimeError("Pillow is not installed")
+
+    base, items = get_layers(rasterizer)
+    states = board_states(board)
+
+    frame = None
+
+    if previous is not None:
+        frame = previous_frame(previous, rasterizer)
+
+    if frame is None:
+        frame = base.copy()
+
+        for element_id, sprites in items:
+            sprite = sprites.get(states.get(element_id))
+
+            if sprite is None:
+                continue
+
+            offset, image = sprite
+            frame.alpha_composite(image, dest=offset)
+
+    else:
+        previous_states, frame = frame
+        frame = frame.copy()
+
+        for element_id, sprites in items:
+            state = states.get(element_id)
+            previous_state = previous_states.get(element_id)
+
+            if state == previous_state:
+                continue
+
+            # Either state may have no sprite (an empty territory), but
+            # every sprite of an element covers the same area
+            sprite = sprites.get(state) or sprites.get(previous_state)
+            redraw(frame, sprite_box(sprite), base, items, states)
+
+    frames.put(frame_key(board, rasterizer), (states, frame))
+
+    return image_to_png(frame)
+
+
+def rasterize_board(board, rasterizer, composite, previous=None):
+    if composite:
+        try:
+            get_layers(rasterizer)
+        except Exception:
+            # Without the layers, the whole SVG is rasterized instead
+            composite = False
+
+    if composite:
+        return composite_board(board, rasterizer, previous)
+
+    # Rasterizing the whole SVG costs the same however little changed
+    return rasterizers[rasterizer](board_to_svg(board))
+
+
+# Output profiles. Anything but the full size, lossless PNG the boards
+# are rasterized to is encoded from that with Pillow, except for the
+# profiles marked "rasterize": those are drawn from the SVG at their own
+# size, so that they don't wait for the full size image
+
+profiles = {
+    "png": {
+        "format": "PNG",
+        "size": (png_width, png_height)
+    },
+    "png-palette": {
+        "format": "PNG",
+        "size": (png_width, png_height),
+        "colors": 128,
+        "optimize": True
+    },
+    "webp": {
+        "format": "WEBP",
+        "size": (png_width, png_height),
+        "quality": 80
+    },
+    "jpeg": {
+        "format": "JPEG",
+        "size": (960, 881),
+        "quality": 85,
+        "optimize": True
+    },
+    "preview": {
+        "format": "JPEG",
+        "size": (320, 294),
+        "quality": 60,
+        "rasterize": True
+    }
+}
+
+# Without Pillow, there is nothing to encode the other profiles with
+if not have_pillow:
+    profiles = {"png": profiles["png"]}
+
+default_profile = "png"
+preview_profile = "preview"
+
+
+def encode_image(png, profile):
+    if not have_pillow:
+        raise RuntimeError("Pillow is not installed")
+
+    from PIL import Image
+
+    spec = profiles[profile]
+    image = png_to_image(png)
+
+    if image.size != spec["size"]:
+        image = image.resize(spec["size"], Image.LANCZOS)
+
+    if spec["format"] != "PNG" or "colors" in spec:
+        flat = Image.new("RGBA", image.size, "white")
+        flat.alpha_composite(image)
+        image = flat.convert("RGB")
+
+    if "colors" in spec:
+        image = image.quantize(spec["colors"])
+
+    options = {k: spec[k] for k in ("quality", "optimize") if k in spec}
+
+    out = io.BytesIO()
+    image.save(out, spec["format"], **options)
+
+    return out.getvalue()
+
+
+def render_key(board, rasterizer=None, composite=None, profile=None):
+    if composite is None:
+        composite = compositing
+
+    return digest((template_version(), rasterizer or default_rasterizer,
+                   "composite" if composite else "svg",
+                   profile or default_profile,
+                   png_width, png_height, board_key(board)))
+
+
+def cached_render(key):
+    global bytes_saved
+
+    png = get_render_cache().get(key)
+
+    if png is not None:
+        bytes_saved += len(png)
+
+    return png
+
+
+def render_board_png(board, rasterizer=None, use_cache=True, composite=None,
+                     previous=None):
+
+    rasterizer = rasterizer or default_rasterizer
+
+    if composite is None:
+        composite = compositing
+
+    if not use_cache:
+        return rasterize_board(board, rasterizer, composite, previous)
+
+    key = render_key(board, rasterizer, composite, "png")
+    png = cached_render(key)
+
+    if png is not None:
+        return png
+
+    png = rasterize_board(board, rasterizer, composite, previous)
+    get_render_cache().put(key, png)
+
+    return png
+
+
+def render_board_image(board, profile=None, rasterizer=None, use_cache=True,
+                       composite=None, previous=None):
+
+    profile = profile or default_profile
+
+    if profile == "png":
+        return render_board_png(
+            board, rasterizer, use_cache, composite, previous)
+
+    def encode():
+        spec = profiles[profile]
+
+        if spec.get("rasterize"):
+            return encode_image(rasterizers[rasterizer or default_rasterizer](
+                board_to_svg(board), spec["size"]), profile)
+
+        # The full size PNG is cached in any case, as every other profile
+        # of the same board is made from it
+        return encode_image(
+            render_board_png(board, rasterizer, True, composite, previous),
+            profile)
+
+    if not use_cache:
+        return encode()
+
+    key = render_key(board, rasterizer, composite, profile)
+    data = cached_render(key)
+
+    if data is None:
+        data = encode()
+        get_render_cache().put(key, data)
+
+    return data
+
+
+# Order arrows are drawn with Pillow over the image of the board. Where
+# every piece sits, and the arrow between any two pieces that can move
+# into each other, are worked out once
+
+order_arrows = have_pillow
+
+arrow_colors = {
+    True: (30, 158, 30, 255),
+    False: (208, 28, 28, 255)
+}
+
+piece_radius = 14
+head_length = 16
+head_width = 8
+
+
+def make_arrow(anchors, a, b):
+    (x0, y0), (x1, y1) = anchors[a], anchors[b]
+
+    length = ((x1 - x0)**2 + (y1 - y0)**2) ** 0.5
+    ux, uy = (x1 - x0) / length, (y1 - y0) / length
+
+    start = (x0 + ux * piece_radius, y0 + uy * piece_radius)
+    tip = (x1 - ux * piece_radius, y1 - uy * piece_radius)
+    base = (tip[0] - ux * head_length, tip[1] - uy * head_length)
+
+    head = [
+        tip,
+        (base[0] - uy * head_width, base[1] + ux * head_width),
+        (base[0] + uy * head_width, base[1] - ux * head_width)
+    ]
+
+    middle = ((start[0] + tip[0]) / 2, (start[1] + tip[1]) / 2)
+
+    return start, base, head, middle
+
+
+@bundle.part("arrows", "assets/board.svg", "assets/sea_graph",
+             "assets/land_graph", modules=("board",),
+             salt=(png_width, png_height, piece_radius, head_length, head_width))
+def build_arrows():
+    root = board_svg()
+
+    x0, y0, width, height = map(float, root.get("viewBox").split())
+    sx = png_width / width
+    sy = png_height / height
+
+    anchors = {}
+
+    for element_id in element_paths():
+        if not piece_re.match(element_id):
+            continue
+
+        # Every piece is placed with matrix(a, b, c, d, e, f), where
+        # (e, f) is where its center ends up
+        transform = find_element(root, element_id).get("transform")
+        e, f = map(float, re.findall(r"[-\d.e]+", transform)[4:6])
+
+        anchors[element_id] = ((e - x0) * sx, (f - y0) * sy)
+
+    pieces = {}
+
+    for element_id in anchors:
+        pieces.setdefault(element_id[:3], []).append(element_id)
+
+    arrows = {}
+
+    for t1, t2 in full_graph.edges():
+        for a in pieces.get(t1, ()):
+            for b in pieces.get(t2, ()):
+                # Armies move to armies and fleets to fleets
+                if a[4] == b[4]:
+                    arrows[a, b] = make_arrow(anchors, a, b)
+                    arrows[b, a] = make_arrow(anchors, b, a)
+
+    return anchors, arrows
+
+
+def get_anchor(element_id):
+    return bundle.get("arrows")[0][element_id]
+
+
+def get_arrow(a, b):
+    anchors, arrows = bundle.get("arrows")
+
+    try:
+        return arrows[a, b]
+
+    except KeyError:
+        # Convoyed moves are the only ones between pieces that aren't
+        # adjacent
+        ret = arrows[a, b] = make_arrow(anchors, a, b)
+        return ret
+
+
+def dashed_line(draw, start, end, fill, width, dash=10):
+    (x0, y0), (x1, y1) = start, end
+
+    length = ((x1 - x0)**2 + (y1 - y0)**2) ** 0.5
+    n = max(int(length // dash), 1)
+
+    for i in range(0, n, 2):
+        a, b = i / n, min(i + 1, n) / n
+        draw.line([(x0 + (x1 - x0) * a, y0 + (y1 - y0) * a),
+                   (x0 + (x1 - x0) * b, y0 + (y1 - y0) * b)],
+                  fill=fill, width=width)
+
+
+def draw_orders(image, board, orders, resolutions):
+    from PIL import ImageDraw
+
+    draw = ImageDraw.Draw(image)
+
+    def unit(t):
+        return piece_id(t, board[t].kind, board[t].coast)
+
+    def move_arrow(t1, t2, coast=None):
+        kind = board[t1].kind
+        return get_arrow(unit(t1), piece_id(t2, kind, coast))
+
+    # Supports and convoys name no coast: they point at the arrow of the
+    # move they go with, which does
+    move_coasts = {(o.terr, o.targ): o.coast
+                   for o in orders if o.kind == "MOVE"}
+
+    for o, r in zip(orders, resolutions):
+        color = arrow_colors[bool(r)]
+
+        if not board[o.terr].occupied:
+            continue
+
+        if o.kind == "HOLD":
+            x, y = get_anchor(unit(o.terr))
+            draw.ellipse((x - piece_radius, y - piece_radius,
+                          x + piece_radius, y + piece_radius),
+                         outline=color, width=3)
+
+        elif o.kind == "MOVE":
+            start, base, head, middle = move_arrow(o.terr, o.targ, o.coast)
+            draw.line([start, base], fill=color, width=4)
+            draw.polygon(head, fill=color)
+
+        elif o.kind == "SUPH":
+            if not board[o.targ].occupied:
+                continue
+
+            start, base, head, middle = get_arrow(unit(o.terr), unit(o.targ))
+            dashed_line(draw, start, head[0], color, 3)
+
+        elif o.kind in ("SUPM", "CONV"):
+            if not board[o.orig].occupied:
+                continue
+
+            middle = move_arrow(
+                o.orig, o.targ, move_coasts.get((o.orig, o.targ)))[3]
+            start = get_anchor(unit(o.terr))
+
+            if o.kind == "SUPM":
+                dashed_line(draw, start, middle, color, 3)
+            else:
+                draw.line([start, middle], fill=color, width=2)
+
+            x, y = middle
+            draw.ellipse((x - 4, y - 4, x + 4, y + 4), fill=color)
+
+    return image
+
+
+def orders_key(board, orders, resolutions, rasterizer=None, profile=None):
+    return digest((render_key(board, rasterizer, profile=profile),
+                   [str(o) for o in orders], [bool(r) for r in resolutions]))
+
+
+def render_orders_image(board, orders, resolutions, profile=None,
+                        rasterizer=None, previous=None):
+
+    if not have_pillow:
+        raise RuntimeError("Pillow is not installed")
+
+    png = render_board_png(board, rasterizer, previous=previous)
+
+    image = draw_orders(png_to_image(png), board, orders, resolutions)
+    png = image_to_png(image)
+
+    if (profile or default_profile) == "png":
+        return png
+
+    return encode_image(png, profile)
+
+
+def preload():
+    # Runs as the initializer of the render workers, and an initializer
+    # that raises breaks the whole pool: rasterize_board() will try again
+    # and fall back if the layers really can't be had
+    if compositing:
+        try:
+            get_layers()
+        except Exception:
+            pass
+
+
+class RenderService:
+    """Renders boards on a pool of worker processes
+
+    Jobs for an image that is already being rendered get the same
+    future as the first one. The workers share the disk tier of the
+    cache with this process, so an image rendered by one of them is
+    never rendered again
+    """
+
+    def __init__(self, workers=None):
+        # The workers are started when the first job comes in, by then
+        # from a thread of a process where other threads may hold locks:
+        # spawn them rather than fork
+        self.pool = ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context("spawn"),
+            initializer=preload)
+        self.pending = {}
+        self.lock = threading.Lock()
+
+        self.submitted = 0
+        self.coalesced = 0
+
+    def lookup(self, board, profile=None, rasterizer=None):
+        return cached_render(render_key(board, rasterizer, profile=profile))
+
+    def submit(self, board, profile=None, rasterizer=None, previous=None):
+        if previous is not None:
+            previous = previous.compact()
+
+        return self.run(
+            render_key(board, rasterizer, profile=profile),
+            render_board_image, board.compact(), profile, rasterizer,
+            previous=previous)
+
+    def submit_orders(self, board, orders, resolutions, profile=None,
+                      rasterizer=None):
+
+        return self.run(
+            orders_key(board, orders, resolutions, rasterizer, profile),
+            render_orders_image, board.compact(), list(orders),
+            list(resolutions), profile, rasterizer)
+
+    def run(self, key, fn, *args, **kwargs):
+        data = cached_render(key)
+
+        if data is not None:
+            future = Future()
+            future.set_result(data)
+            return future
+
+        with self.lock:
+            future = self.pending.get(key)
+
+            if future is not None:
+                self.coalesced += 1
+                return future
+
+            # The arguments are only pickled once a worker picks the job
+            # up, so they must not change in the meantime: boards are
+            # passed as compact snapshots, which are also cheap to pickle
+            future = self.pool.submit(fn, *args, **kwargs)
+
+            self.pending[key] = future
+            self.submitted += 1
+
+        future.add_done_callback(lambda f: self.done(key, f))
+
+        return future
+
+    def done(self, key, future):
+        # Workers store board images on disk themselves, and orders are
+        # only drawn once per turn. Keep the image in memory before
+        # forgetting the job, or a request coming in between would find
+        # neither
+        if not future.cancelled() and future.exception() is None:
+            get_render_cache().memory.put(key, future.result())
+
+        with self.lock:
+            self.pending.pop(key, None)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "submitted": self.submitted,
+                "coalesced": self.coalesced,
+                "pending": len(self.pending)
+            }
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+
+def compare_rasterizers(names):
+    board = Board()
+    svg = board_to_svg(board)
+
+    for name in names:
+        start = time.perf_counter()
+
+        try:
+            png = rasterizers[name](svg)
+        except Exception as e:
+            print("{}: failed ({})".format(name, e))
+            continue
+
+        elapsed = time.perf_counter() - start
+
+        with open("board_{}.png".format(name), "wb") as f:
+            f.write(png)
+
+        print("{}: {:.3f}s, {} bytes, written to board_{}.png".format(
+            name, elapsed, len(png), name))
+
+
+def compare_composite(rasterizer=None):
+    from PIL import ImageChops
+
+    board = Board()
+
+    start = time.perf_counter()
+    get_layers(rasterizer)
+    print("layers: {:.3f}s".format(time.perf_counter() - start))
+
+    start = time.perf_counter()
+    png = composite_board(board, rasterizer)
+    elapsed = time.perf_counter() - start
+
+    with open("board_composite.png", "wb") as f:
+        f.write(png)
+
+    print("composite: {:.3f}s, {} bytes, written to board_composite.png".format(
+        elapsed, len(png)))
+
+    reference = png_to_image(
+        rasterizers[rasterizer or default_rasterizer](board_to_svg(board)))
+
+    diff = ImageChops.difference(reference, png_to_image(png))
+    diff = max(hi for lo, hi in diff.getextrema())
+
+    print("largest channel difference from the SVG rendering:", diff)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["composite"]:
+        compare_composite()
+    else:
+        compare_rasterizers(sys.argv[1:] or sorted(rasterizers))
@@ -46,13 +46,17 @@ def private_chat(f):
 def game_in_chat(f):
     def wrapper(self, bot, update):
         try:
-            f(self, bot, update, self.games[update.message.chat.id])
+            game = self.games[update.message.chat.id]
 
         except KeyError:
             update.message.reply_text(
                 "There is no game currently running in this chat\n"
                 "Start one with /newgame!")
 
+        else:
+            with game.lock:
+                f(self, bot, update, game)
+
     return wrapper
 
 
@@ -90,7 +94,8 @@ def player_in_game(f):
             update.message.reply_text("You need to join a game to use this command")
 
         else:
-            f(self, bot, update, game, game.players[p_id])
+            with game.lock:
+                f(self, bot, update, game, game.players[p_id])
 
     return wrapper
 
@@ -18,6 +18,8 @@
   ############################################################################
 
 
+import re
+
 from copy import copy
 from functools import total_ordering
 
@@ -85,6 +87,57 @@ class Order:
         return self.key() == other.key()
 
 
+order_re = re.compile(
+    r"^(?P<terr>\w{3})(?:"
+    r"\s+(?P<hold>H)|"
+    r"\s*-\s*(?P<targ>\w{3})(?P<coast>\((?:NC|SC)\))?(?P<via_c>\s+C)?|"
+    r"\s+S\s+(?P<sup_orig>\w{3})(?:\(\w\w\))?"
+    r"(?:\s*-\s*(?P<sup_targ>\w{3})(?:\(\w\w\))?)?|"
+    r"\s+C\s+(?P<conv_orig>\w{3})\s*-\s*(?P<conv_targ>\w{3})"
+    r")$", re.IGNORECASE)
+
+
+def parse_order(s):
+    m = order_re.match(s.strip())
+
+    if not m:
+        raise ValueError(s)
+
+    def terr(group):
+        try:
+            return terr_names.match_case(m.group(group))
+        except KeyError:
+            raise ValueError(s)
+
+    o = Order()
+    o.terr = terr("terr")
+
+    if m.group("hold"):
+        o.kind = "HOLD"
+
+    elif m.group("targ"):
+        o.kind = "MOVE"
+        o.targ = terr("targ")
+        o.coast = m.group("coast") and m.group("coast").upper()
+        o.via_c = bool(m.group("via_c"))
+
+    elif m.group("sup_targ"):
+        o.kind = "SUPM"
+        o.orig = terr("sup_orig")
+        o.targ = terr("sup_targ")
+
+    elif m.group("sup_orig"):
+        o.kind = "SUPH"
+        o.targ = terr("sup_orig")
+
+    else:
+        o.kind = "CONV"
+        o.orig = terr("conv_orig")
+        o.targ = terr("conv_targ")
+
+    return o
+
+
 class BuilderError(Exception):
     def __init__(self, message):
         super().__init__(self)
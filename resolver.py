@@ -0,0 +1,555 @@
+  ############################################################################
+  # Diplobot - play Diplomacy through Telegram                               #
+  # Copyright (C) 2018 Simone Cimarelli a.k.a. AquilaIrreale                 #
+  #                                                                          #
+  # This program is free software: you can redistribute it and/or modify     #
+  # it under the terms of the GNU Affero General Public License as published #
+  # by the Free Software Foundation, either version 3 of the License, or     #
+  # (at your option) any later version.                                      #
+  #                                                                          #
+  # This program is distributed in the hope that it will be useful,          #
+  # but WITHOUT ANY WARRANTY; without even the implied warranty of           #
+  # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the            #
+  # GNU Affero General Public License for more details.                      #
+  #                                                                          #
+  # You should have received a copy of the GNU Affero General Public License #
+  # along with this program.  If not, see <http://www.gnu.org/licenses/>.    #
+  ############################################################################
+
+
+# In-process adjudicator, based on the algorithm described by Lucas
+# Kruijswijk in "The Math of Adjudication" (guess and check resolution
+# with a backup rule for circular movement and convoy paradoxes)
+
+from board import (coast,
+                   land_graph,
+                   offshore,
+                   sea_graph,
+                   split_coasts,
+                   strip_coast)
+
+
+UNRESOLVED, GUESSING, RESOLVED = range(3)
+
+INFINITY = float("inf")
+
+army_reach = {t: frozenset(ts) for t, ts in land_graph.dict.items()}
+
+fleet_reach = {
+    t: frozenset(strip_coast(t2) for t2 in ts)
+    for t, ts in sea_graph.dict.items()
+}
+
+sea_neighbors = {
+    t: frozenset(t2 for t2 in ts if t2 in offshore)
+    for t, ts in sea_graph.dict.items()
+    if t in offshore
+}
+
+
+def unit_node(t, kind, c):
+    if kind == "F" and t in split_coasts and c:
+        return t + c
+
+    return t
+
+
+def reach(t, kind, node):
+    if kind == "A":
+        return army_reach.get(t, frozenset())
+
+    if node in fleet_reach:
+        return fleet_reach[node]
+
+    # Fleet on a split coast with no coast recorded
+    return frozenset().union(
+        *(fleet_reach.get(t + c, ()) for c in ("(NC)", "(SC)")))
+
+
+def fleet_move_legal(node, t2, c):
+    neighs = sea_graph.dict.get(node, ())
+
+    if t2 not in split_coasts:
+        return t2 in neighs
+
+    if c:
+        return t2 + c in neighs
+
+    return sum(1 for n in neighs if strip_coast(n) == t2) == 1
+
+
+class Resolver:
+    def __init__(self, board, orders):
+        self.kind = []
+        self.src = []
+        self.orig = []
+        self.dst = []
+        self.coast = []
+        self.via_c = []
+        self.nation = []
+
+        self.by_terr = {}
+        self.moves_to = {}
+        self.hold_supports = {}
+        self.move_supports = {}
+        self.convoys = {}
+
+        self.units = {
+            t: (terr.occupied, terr.kind, unit_node(t, terr.kind, terr.coast))
+            for t, terr in board.items() if terr.occupied
+        }
+
+        # Whatever their orders, these are the fleets that could make up
+        # a convoy
+        self.fleets_at_sea = frozenset(
+            t for t, (n, k, node) in self.units.items()
+            if k == "F" and t in offshore)
+
+        for o in orders:
+            self.add(o.kind, o.terr, o.orig, o.targ, o.coast, o.via_c)
+
+        self.given = len(self.kind)
+
+        for t in self.units:
+            if t not in self.by_terr:
+                self.add("HOLD", t, None, None, None, None)
+
+        n = len(self.kind)
+
+        self.legal = [False] * n
+
+        for i in range(n):
+            if self.kind[i] == "MOVE" and self.nation[i]:
+                self.legal[i] = self.check_move(i)
+
+                if self.legal[i]:
+                    self.moves_to.setdefault(self.dst[i], []).append(i)
+
+        for i in range(n):
+            if self.kind[i] != "MOVE" and self.nation[i]:
+                self.legal[i] = self.check(i)
+
+                if self.legal[i]:
+                    self.register(i)
+
+        self.state = [UNRESOLVED if legal else RESOLVED for legal in self.legal]
+        self.result = [False] * n
+        self.dep = []
+        self.depth = [0] * n
+        self.level = 0
+        self.low = INFINITY
+
+    def add(self, kind, t, orig, targ, c, via_c):
+        self.kind.append(kind)
+        self.src.append(t)
+        self.orig.append(orig)
+        self.dst.append(targ)
+        self.coast.append(c)
+        self.via_c.append(via_c)
+
+        if t not in self.units or t in self.by_terr:
+            # No such unit, or it has been ordered already
+            self.nation.append(None)
+            return
+
+        self.nation.append(self.units[t][0])
+        self.by_terr[t] = len(self.kind) - 1
+
+        if kind == "CONV" and self.units[t][1] == "F" and t in offshore:
+            self.convoys.setdefault((orig, targ), set()).add(t)
+
+    def register(self, i):
+        kind = self.kind[i]
+
+        if kind == "SUPH":
+            self.hold_supports.setdefault(self.dst[i], []).append(i)
+
+        elif kind == "SUPM":
+            self.move_supports.setdefault(
+                (self.orig[i], self.dst[i]), []).append(i)
+
+    def check_move(self, i):
+        t = self.src[i]
+        t2 = self.dst[i]
+        n, k, node = self.units[t]
+
+        if t2 == t:
+            return False
+
+        if k == "A":
+            adjacent = t2 in army_reach.get(t, ())
+        else:
+            adjacent = fleet_move_legal(node, t2, self.coast[i])
+
+        # A move between two coasts that the fleets on the board could
+        # convoy is a move by convoy, which simply fails when they don't
+        # (it still can't receive hold support, for example). Without
+        # such fleets the move is impossible, and the army holds
+        self.via_c[i] = (k == "A"
+                         and (self.via_c[i] or not adjacent)
+                         and self.chain(t, t2, self.fleets_at_sea))
+
+        return adjacent or self.via_c[i]
+
+    def check(self, i):
+        kind = self.kind[i]
+        t = self.src[i]
+        n, k, node = self.units[t]
+
+        if kind == "HOLD":
+            return True
+
+        if kind == "SUPH":
+            j = self.by_terr.get(self.dst[i])
+
+            return (self.dst[i] in reach(t, k, node)
+                    and j is not None
+                    and not self.is_move(j))
+
+        j = self.by_terr.get(self.orig[i])
+
+        if j is None or not self.is_move(j) or self.dst[j] != self.dst[i]:
+            return False
+
+        if kind == "SUPM":
+            return self.dst[i] in reach(t, k, node)
+
+        if kind == "CONV":
+            return t in self.convoys.get((self.orig[i], self.dst[i]), ())
+
+        return False
+
+    def is_move(self, i):
+        # Illegal moves are treated as holds
+        return self.kind[i] == "MOVE" and self.legal[i]
+
+    def convoy_succeeds(self, f):
+        return self.resolve(self.by_terr[f])
+
+    def convoy_chain(self, t1, t2, usable):
+        return self.chain(t1, t2, self.convoys.get((t1, t2)), usable)
+
+    def chain(self, t1, t2, fleets, usable=None):
+        if t1 not in coast or t2 not in coast or not fleets:
+            return False
+
+        to_check = [f for f in fleets if t1 in fleet_reach[f]]
+        checked = set(to_check)
+
+        while to_check:
+            f = to_check.pop()
+
+            if usable is not None and not usable(f):
+                continue
+
+            if t2 in fleet_reach[f]:
+                return True
+
+            for f2 in sea_neighbors[f]:
+                if f2 in fleets and f2 not in checked:
+                    checked.add(f2)
+                    to_check.append(f2)
+
+        return False
+
+    def path(self, i):
+        if not self.via_c[i]:
+            return True
+
+        return self.convoy_chain(self.src[i], self.dst[i], self.convoy_succeeds)
+
+    def head_to_head(self, i, j):
+        return (j is not None
+                and self.is_move(j)
+                and self.dst[j] == self.src[i]
+                and not self.via_c[i]
+                and not self.via_c[j])
+
+    def count_supports(self, supports, excluded=None):
+        ret = 0
+
+        for s in supports:
+            if self.nation[s] != excluded and self.resolve(s):
+                ret += 1
+
+        return ret
+
+    def attack_strength(self, i):
+        if not self.path(i):
+            return 0
+
+        t2 = self.dst[i]
+        j = self.by_terr.get(t2)
+        supports = self.move_supports.get((self.src[i], t2), ())
+
+        if (j is None
+                or (self.is_move(j)
+                    and not self.head_to_head(i, j)
+                    and self.resolve(j))):
+
+            return 1 + self.count_supports(supports)
+
+        if self.nation[j] == self.nation[i]:
+            return 0
+
+        return 1 + self.count_supports(supports, self.nation[j])
+
+    def defend_strength(self, i):
+        supports = self.move_supports.get((self.src[i], self.dst[i]), ())
+        return 1 + self.count_supports(supports)
+
+    def prevent_strength(self, i):
+        if not self.path(i):
+            return 0
+
+        j = self.by_terr.get(self.dst[i])
+
+        if self.head_to_head(i, j) and self.resolve(j):
+            return 0
+
+        supports = self.move_supports.get((self.src[i], self.dst[i]), ())
+        return 1 + self.count_supports(supports)
+
+    def hold_strength(self, t):
+        j = self.by_terr.get(t)
+
+        if j is None:
+            return 0
+
+        if self.is_move(j):
+            return 0 if self.resolve(j) else 1
+
+        return 1 + self.count_supports(self.hold_supports.get(t, ()))
+
+    def adjudicate_move(self, i):
+        if not self.path(i):
+            return False
+
+        t2 = self.dst[i]
+        attack = self.attack_strength(i)
+        j = self.by_terr.get(t2)
+
+        if self.head_to_head(i, j):
+            if attack <= self.defend_strength(j):
+                return False
+
+        elif attack <= self.hold_strength(t2):
+            return False
+
+        for k in self.moves_to[t2]:
+            if k != i and attack <= self.prevent_strength(k):
+                return False
+
+        return True
+
+    def adjudicate_support(self, i):
+        t = self.src[i]
+
+        for m in self.moves_to.get(t, ()):
+            if self.nation[m] == self.nation[i]:
+                continue
+
+            if self.kind[i] == "SUPM" and self.src[m] == self.dst[i]:
+                # An attack from the target only cuts by dislodging
+                if self.resolve(m):
+                    return False
+
+            elif self.path(m):
+                return False
+
+        return True
+
+    def adjudicate_convoy(self, i):
+        for m in self.moves_to.get(self.src[i], ()):
+            if self.resolve(m):
+                return False
+
+        return True
+
+    adjudicators = {
+        "MOVE": adjudicate_move,
+        "SUPH": adjudicate_support,
+        "SUPM": adjudicate_support,
+        "CONV": adjudicate_convoy
+    }
+
+    def adjudicate(self, i):
+        return self.adjudicators[self.kind[i]](self, i)
+
+    def resolve(self, i):
+        state = self.state[i]
+
+        if state == RESOLVED:
+            return self.result[i]
+
+        if state == GUESSING:
+            # Either an open guess further up the stack, or a result that
+            # depends on one: both tie the caller to that guess
+            self.low = min(self.low, self.depth[i])
+            return self.result[i]
+
+        outer = self.low
+        level = self.level
+        old = len(self.dep)
+
+        self.level += 1
+        self.depth[i] = level
+
+        first = self.guess(i, False)
+        low = self.low
+
+        if low < level:
+            # Part of a cycle which is closed further up the stack
+            self.pending(i, first, low)
+
+        elif low == level:
+            # Head of a cycle: check whether the other guess agrees
+            self.reset_deps(old)
+            second = self.guess(i, True)
+
+            if self.low < level:
+                self.pending(i, second, self.low)
+
+            elif first == second or self.low > level:
+                self.reset_deps(old)
+                self.result[i] = second
+                self.state[i] = RESOLVED
+
+            else:
+                self.backup_rule(i, old)
+
+        else:
+            self.result[i] = first
+            self.state[i] = RESOLVED
+
+        self.level = level
+        self.low = min(outer, self.low)
+
+        return self.resolve(i) if self.state[i] == UNRESOLVED else self.result[i]
+
+    def guess(self, i, result):
+        self.result[i] = result
+        self.state[i] = GUESSING
+        self.low = INFINITY
+
+        return self.adjudicate(i)
+
+    def pending(self, i, result, low):
+        self.dep.append(i)
+        self.result[i] = result
+        self.depth[i] = low
+
+    def reset_deps(self, old):
+        for j in self.dep[old:]:
+            self.state[j] = UNRESOLVED
+
+        del self.dep[old:]
+
+    def backup_rule(self, i, old):
+        cycle = [i] + self.dep[old:]
+        del self.dep[old:]
+
+        if any(self.kind[j] == "CONV" for j in cycle):
+            # Convoy paradox (Szykman rule): the convoys fail
+            for j in cycle:
+                if self.kind[j] == "CONV":
+                    self.result[j] = False
+                    self.state[j] = RESOLVED
+                else:
+                    self.state[j] = UNRESOLVED
+
+        else:
+            # Circular movement: every move in the circle succeeds
+            for j in cycle:
+                if self.kind[j] == "MOVE":
+                    self.result[j] = True
+                    self.state[j] = RESOLVED
+                else:
+                    self.state[j] = UNRESOLVED
+
+    def dislodger(self, t):
+        j = self.by_terr[t]
+
+        if self.is_move(j) and self.resolve(j):
+            return None
+
+        for m in self.moves_to.get(t, ()):
+            if self.resolve(m):
+                return m
+
+        return None
+
+    def retreats(self):
+        dislodged = {}
+
+        for t in self.units:
+            m = self.dislodger(t)
+
+            if m is not None:
+                dislodged[t] = m
+
+        if not dislodged:
+            return {}
+
+        occupied = set()
+        contested = set()
+
+        for t, i in self.by_terr.items():
+            if self.is_move(i):
+                if self.resolve(i):
+                    occupied.add(self.dst[i])
+                    continue
+
+                # A unit beaten head to head by the unit it was attacking
+                # leaves no standoff behind
+                m = dislodged.get(t)
+                beaten = (m is not None and self.src[m] == self.dst[i]
+                          and not self.via_c[m] and not self.via_c[i])
+
+                if self.path(i) and not beaten:
+                    contested.add(self.dst[i])
+
+            occupied.add(t)
+
+        ret = {}
+
+        for t, m in dislodged.items():
+            n, k, node = self.units[t]
+            options = reach(t, k, node) - occupied - contested
+
+            if not self.via_c[m]:
+                options -= {self.src[m]}
+
+            ret[t] = set(options)
+
+        return ret
+
+    def run(self):
+        retreats = self.retreats()
+
+        resolutions = []
+
+        for i in range(self.given):
+            if self.kind[i] == "HOLD":
+                resolutions.append(self.legal[i] and self.src[i] not in retreats)
+            elif self.legal[i]:
+                resolutions.append(self.resolve(i))
+            else:
+                resolutions.append(False)
+
+        return resolutions, retreats
+
+
+def adjudicate(board, orders):
+    return Resolver(board, orders).run()
+
+
+def retreats(board, orders, resolutions):
+    r = Resolver(board, orders)
+
+    for i, res in enumerate(resolutions):
+        if r.kind[i] != "HOLD" and r.state[i] != RESOLVED:
+            r.result[i] = bool(res)
+            r.state[i] = RESOLVED
+
+    return r.retreats()